@@ -1,5 +1,7 @@
 class AnalysisWorker(QObject):
-    finished = Signal(str, str, object)  # nifti_path, mask_path, top_features_df
+    finished = Signal(object, object, object)  # ct Volume, mask Volume, top_features_df
+    patient = Signal(str)  # patient_name
+    progress = Signal(int, str)  # percent, step
     log = Signal(str)
     error = Signal(str)
 
@@ -7,28 +9,50 @@ class AnalysisWorker(QObject):
         super().__init__()
         self.dicom_path = dicom_path
         self.threshold = threshold
+        # 작업 실행기가 취소를 알리는 창구 (단계 사이에서 확인)
+        self.token = CancelToken(lambda f, m: self.progress.emit(int(f * 100), m))
 
    
     def run(self):
         try:
+            self.token.report(0.0, "환자 정보")
             self.log.emit("[1] 환자 성함 확인 중...")
-            name = collect_patient_information(self.dicom_path)
+            # 폴더 header 를 한 번만 읽어 이후 단계가 같은 인덱스를 사용
+            index = get_index(self.dicom_path, refresh=True)
+            name = collect_patient_information(self.dicom_path, index)
+            self.patient.emit(name)
 
+            # 이미 처리한 study 는 저장된 결과를 그대로 사용
+            store = get_artifact_store()
+
+            self.token.report(0.05, "DICOM 변환")
             self.log.emit("[2] DICOM → NIfTI 변환 중...")
-            nifti_path = dicom_to_nifti_ras(self.dicom_path)
+            # 단계 사이에는 Volume 을 메모리로 넘김 (저장소 사본은 재실행용)
+            nifti_key, ct = cached_convert(store, self.dicom_path, self.log.emit)
 
+            self.token.report(0.2, "segmentation")
             self.log.emit("[3] 췌장 segmentation 중...")
-            mask_path = run_TS(nifti_path)
+            mask_key, mask = cached_segment(store, nifti_key, ct, self.log.emit)
+            if mask is None:
+                raise RuntimeError("췌장 mask 가 생성되지 않았습니다.")
         
+            self.token.report(0.6, "radiomics")
             self.log.emit("[4] Radiomics 추출 중...")
             yaml_path = r'c:\Users\RaPhyA\Desktop\Nous\assets\parameters.yaml'
-            radiomics = extract_radiomics(nifti_path, mask_path, yaml_path)
+            feature_key, radiomics = cached_extract(store, mask_key, ct, mask,
+                                                    yaml_path, self.log.emit,
+                                                    n_workers=EXTRACT_WORKERS,
+                                                    crop=True,
+                                                    cache=get_filter_cache())
 
+            self.token.report(0.9, "예측")
             self.log.emit("[5] AI 예측 중...")
             model_path = r'c:\Users\RaPhyA\Desktop\Nous\assets\final_model.pt'
             scaler_path = r'c:\Users\RaPhyA\Desktop\Nous\assets\scaler.pkl'
 
-            result_df, top_features_df = predict_with_model(
+            result_df, top_features_df = cached_predict(
+                store,
+                feature_key,
                 radiomics,
                 name,
                 model_path,
@@ -37,8 +61,13 @@ class AnalysisWorker(QObject):
                 log_callback=self.log.emit
             )
 
-            self.finished.emit(nifti_path, mask_path, top_features_df)
+            # 뷰어는 memory-map 된 CT 를 받아 보이는 slice 만 읽음
+            ct = ct.mapped()
+            self.token.report(1.0, "완료")
+            self.finished.emit(ct, mask, top_features_df)
 
+        except JobCancelled:
+            self.log.emit("⏹️ 이전 분석이 취소되었습니다.")
         except Exception as e:
             self.error.emit(str(e))
             self.error.emit(traceback.format_exc())
@@ -1,52 +1,100 @@
-class EditContourItem(QGraphicsPathItem):
+class EditContourItem(QGraphicsItem):
+    """
+    slice 해상도 bitmap 에 브러시를 바로 찍는 편집 레이어
+
+    scene 좌표 = 화면 slice 픽셀 좌표. 찍을 때마다 브러시 영역만 갱신하므로
+    획이 길어져도 비용이 늘지 않고, 적용할 때는 bitmap 을 그대로 mask 로 사용
+    """
+
+    ALPHA = 110
+
     def __init__(self, diameter=10, colour=Qt.red, mode="erase"):
         super().__init__()
         self.diameter = diameter
         self.mode = mode
-        self.current_path = QPainterPath()
-        self.paths = []
+        self._colour = self._rgba_of(colour)
+        self._last = None
 
-        pen = QPen(colour)
-        pen.setWidth(2)
-        self.setPen(pen)
-        self.setBrush(QBrush(colour, Qt.Dense4Pattern))
         self.setZValue(100)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.reset(0, 0)
+
+    @classmethod
+    def _rgba_of(cls, colour):
+        c = QColor(colour)
+        return np.array([c.red(), c.green(), c.blue(), cls.ALPHA], dtype=np.uint8)
+
+    def reset(self, width, height):
+        """표시 중인 slice 크기로 편집 bitmap 을 새로 만듦"""
+        self.prepareGeometryChange()
+        self.stroke = np.zeros((height, width), dtype=bool)
+        self._rgba = np.zeros((height, width, 4), dtype=np.uint8)
+        self._qimg = QImage(self._rgba.data, width, height, 4 * width,
+                            QImage.Format_RGBA8888)
+        self._last = None
+        self.update()
 
     def set_mode(self, mode):
         self.mode = mode
-        colour = Qt.red if mode == "erase" else Qt.green
-        pen = QPen(colour)
-        pen.setWidth(2)
-        self.setPen(pen)
-        self.setBrush(QBrush(colour, Qt.Dense4Pattern))
+        self._colour = self._rgba_of(Qt.red if mode == "erase" else Qt.green)
+        self._rgba[self.stroke] = self._colour
+        self.update()
 
     def set_brush_size(self, diameter):
         self.diameter = diameter
 
+    # ----------------------------------------------------------
+    def boundingRect(self):
+        h, w = self.stroke.shape
+        return QRectF(0, 0, w, h)
+
+    def paint(self, painter, option, widget=None):
+        # 다시 그려야 하는 부분만 복사
+        rect = option.exposedRect
+        painter.drawImage(rect, self._qimg, rect)
+
+    # ----------------------------------------------------------
+    def _stamp(self, cx, cy):
+        h, w = self.stroke.shape
+        r = self.diameter / 2
+        x0, x1 = max(0, int(np.floor(cx - r))), min(w, int(np.ceil(cx + r)))
+        y0, y1 = max(0, int(np.floor(cy - r))), min(h, int(np.ceil(cy + r)))
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        # 픽셀 중심이 원 안에 들어가는 곳만 칠함
+        yy, xx = np.ogrid[y0:y1, x0:x1]
+        disk = (xx + 0.5 - cx) ** 2 + (yy + 0.5 - cy) ** 2 <= r * r
+        self.stroke[y0:y1, x0:x1] |= disk
+        self._rgba[y0:y1, x0:x1][disk] = self._colour
+        self.update(QRectF(x0, y0, x1 - x0, y1 - y0))
+
     def start_draw(self, pos):
-        self.current_path = QPainterPath()
-        self.current_path.addEllipse(pos, self.diameter/2, self.diameter/2)
-        self.setPath(self.current_path)
+        self._last = (pos.x(), pos.y())
+        self._stamp(*self._last)
 
     def draw(self, pos):
-        p = QPainterPath()
-        p.addEllipse(pos, self.diameter/2, self.diameter/2)
-        self.current_path = self.current_path.united(p)
-        self.setPath(self.current_path)
+        if self._last is None:
+            self.start_draw(pos)
+            return
+
+        # 마우스 이벤트 사이가 벌어져도 획이 끊기지 않도록 반지름 절반 간격으로 찍음
+        x0, y0 = self._last
+        x1, y1 = pos.x(), pos.y()
+        step = max(1.0, self.diameter / 4)
+        n = max(1, int(np.ceil(np.hypot(x1 - x0, y1 - y0) / step)))
+        for t in np.linspace(1.0 / n, 1.0, n):
+            self._stamp(x0 + (x1 - x0) * t, y0 + (y1 - y0) * t)
+        self._last = (x1, y1)
 
     def end_draw(self):
-        if not self.current_path.isEmpty():
-            self.paths.append(self.current_path)
-        self.current_path = QPainterPath()
-        self.setPath(QPainterPath())
+        self._last = None
 
     def clear(self):
-        self.paths.clear()
-        self.current_path = QPainterPath()
-        self.setPath(QPainterPath())
-
-    def get_merged_path(self):
-        merged = QPainterPath()
-        for p in self.paths:
-            merged = merged.united(p)
-        return merged
+        self.stroke[...] = False
+        self._rgba[...] = 0
+        self._last = None
+        self.update()
+
+    def has_edits(self):
+        return bool(self.stroke.any())
@@ -5,28 +5,43 @@ class RadiomicsAnalyzer(QWidget):
         self.setGeometry(200, 100, 1500, 900)
 
     
-        self.thread = None
+        # 분석 / 재예측은 상주 작업 실행기에서 실행 (작업마다 QThread 를 만들지 않음)
+        self.jobs = get_job_executor()
         self.worker = None
-        self.repredict_thread = None
         self.repredict_worker = None
 
         self.nifti_vol = None
         self.mask_vol = None
-        self.current_view = "axial"
-        self.zoom_factor = 1.0
+        self.journal = None
+        self.renderer = None
+        self.current_view = "axial"  # 편집/슬라이더가 따라가는 pane
+        self.cursor = [0, 0, 0]       # 세 pane 이 공유하는 crosshair (x, y, z)
+        self.slice_ranges = {}        # view -> (smin, smax)
+        self.shown_sizes = {}         # view -> 화면에 맞춘 slice 크기 (바뀌면 다시 맞춤)
         
         # For repredict
-        self.nifti_path = None
+        self.ct_volume = None
         self.patient_name = None
 
-        # Graphics scene setup
-        self.scene = QGraphicsScene()
-        self.pixmap_item = QGraphicsPixmapItem()
-        self.scene.addItem(self.pixmap_item)
-
-        # Edit item for mask editing
+        # Edit item for mask editing (현재 pane 의 scene 으로 옮겨 다님)
         self.edit_item = EditContourItem(diameter=10, colour=Qt.red, mode="erase")
-        self.scene.addItem(self.edit_item)
+
+        # Graphics scene setup - axial / coronal / sagittal pane
+        self.scenes = {}
+        self.pixmap_items = {}
+        self.crosshairs = {}
+        pen = QPen(QColor(255, 255, 0, 160))
+        pen.setCosmetic(True)
+        for v in SliceRenderer.AXES:
+            scene = QGraphicsScene()
+            self.pixmap_items[v] = scene.addPixmap(QPixmap())
+            lines = (scene.addLine(0, 0, 0, 0, pen), scene.addLine(0, 0, 0, 0, pen))
+            for line in lines:
+                line.setZValue(50)
+                line.setVisible(False)
+            self.crosshairs[v] = lines
+            self.scenes[v] = scene
+        self.scenes[self.current_view].addItem(self.edit_item)
 
         self.init_ui()
 
@@ -36,12 +51,22 @@ class RadiomicsAnalyzer(QWidget):
         # ================= Left (Viewer) =================
         left_layout = QVBoxLayout()
 
-        self.viewer = ImageView(self.scene, self.edit_item)
-        self.viewer.setStyleSheet("background:black;")
-        self.viewer.wheel_slice.connect(self.on_wheel_slice)
-        self.viewer.wheel_zoom.connect(self.on_zoom)
-
-        left_layout.addWidget(self.viewer)
+        # Axial pane 크게, coronal / sagittal 은 오른쪽에 위아래로
+        self.views = {}
+        pane_layout = QGridLayout()
+        positions = {"axial": (0, 0, 2, 1), "coronal": (0, 1, 1, 1), "sagittal": (1, 1, 1, 1)}
+        for v, pos in positions.items():
+            view = ImageView(self.scenes[v], self.edit_item)
+            view.wheel_slice.connect(lambda d, vv=v: self.on_wheel_slice(vv, d))
+            view.clicked.connect(lambda p, vv=v: self.on_pane_clicked(vv, p))
+            self.views[v] = view
+            pane_layout.addWidget(view, *pos)
+        pane_layout.setColumnStretch(0, 2)
+        pane_layout.setColumnStretch(1, 1)
+        self.viewer = self.views[self.current_view]
+        self.highlight_active_pane()
+
+        left_layout.addLayout(pane_layout)
 
         # View change buttons
         btn_layout = QHBoxLayout()
@@ -94,6 +119,30 @@ class RadiomicsAnalyzer(QWidget):
         apply_layout.addWidget(self.apply_edit_btn)
         apply_layout.addWidget(self.clear_edit_btn)
         edit_layout.addLayout(apply_layout)
+
+        # Undo/Redo and mask versions
+        history_layout = QHBoxLayout()
+        self.undo_btn = QPushButton("↶ 되돌리기")
+        self.undo_btn.clicked.connect(self.undo_edit)
+        self.redo_btn = QPushButton("↷ 다시 실행")
+        self.redo_btn.clicked.connect(self.redo_edit)
+        QShortcut(QKeySequence.Undo, self, self.undo_edit)
+        QShortcut(QKeySequence.Redo, self, self.redo_edit)
+        history_layout.addWidget(self.undo_btn)
+        history_layout.addWidget(self.redo_btn)
+        edit_layout.addLayout(history_layout)
+
+        version_layout = QHBoxLayout()
+        self.save_version_btn = QPushButton("버전 저장")
+        self.save_version_btn.clicked.connect(self.save_mask_version)
+        self.version_combo = QComboBox()
+        self.version_combo.setPlaceholderText("저장된 버전")
+        self.version_combo.activated.connect(
+            lambda i: self.restore_mask_version(self.version_combo.itemText(i))
+        )
+        version_layout.addWidget(self.save_version_btn)
+        version_layout.addWidget(self.version_combo, 1)
+        edit_layout.addLayout(version_layout)
         
         # Repredict button
         self.repredict_btn = QPushButton("🔄 재예측")
@@ -105,7 +154,7 @@ class RadiomicsAnalyzer(QWidget):
         left_layout.addWidget(edit_box)
 
         self.slice_slider = QSlider(Qt.Horizontal)
-        self.slice_slider.valueChanged.connect(self.update_slice_view)
+        self.slice_slider.valueChanged.connect(self.on_slider)
         left_layout.addWidget(self.slice_slider)
 
         # ================= Right (Control) =================
@@ -141,6 +190,10 @@ class RadiomicsAnalyzer(QWidget):
         right_layout.addWidget(dicom_box)
         right_layout.addWidget(mode_box)
         right_layout.addWidget(self.run_btn)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        right_layout.addWidget(self.progress_bar)
         right_layout.addWidget(self.log_box, 1)
 
         layout.addLayout(left_layout, 7)
@@ -160,93 +213,62 @@ class RadiomicsAnalyzer(QWidget):
             self.dicom_path = folder
             self.dicom_label.setText(folder)
 
-    def cleanup_thread(self, thread_attr_name, worker_attr_name):
-        """이전 스레드와 워커를 안전하게 정리 (방어적 코딩 적용)"""
-        
-        # 1. 워커(Worker) 정리
-        if hasattr(self, worker_attr_name):
-            worker = getattr(self, worker_attr_name)
-            if worker is not None:
-                try:
-                    # C++ 객체가 살아있는지 확인 (Deleted 객체 접근 방지)
-                    worker.disconnect() 
-                    worker.deleteLater()
-                except RuntimeError:
-                    pass # 이미 삭제된 객체면 무시
-                except Exception as e:
-                    print(f"Worker cleanup error: {e}")
-            
-            # Python 변수 초기화
-            setattr(self, worker_attr_name, None)
-
-        # 2. 스레드(Thread) 정리
-        if hasattr(self, thread_attr_name):
-            thread = getattr(self, thread_attr_name)
-            if thread is not None:
-                try:
-                    # 스레드가 실행 중인지 안전하게 확인
-                    if thread.isRunning():
-                        thread.quit()
-                        # wait를 너무 길게 잡으면 GUI가 멈춤 -> 100ms로 단축
-                        if not thread.wait(100): 
-                            thread.terminate() # 안 꺼지면 강제 종료
-                            thread.wait(10)
-                    
-                    thread.deleteLater()
-                except RuntimeError:
-                    pass # 이미 삭제된 객체면 무시
-                except Exception as e:
-                    print(f"Thread cleanup error: {e}")
-            
-            # Python 변수 초기화
-            setattr(self, thread_attr_name, None)
-        
-        # 메모리 정리는 너무 자주하면 렉 걸리므로, 필요할 때만 수행하거나 제거
-        # import gc
-        # gc.collect()
+    def cancel_job(self, worker_attr_name):
+        """이전 작업에 취소를 알리고 결과 시그널을 끊음 (스레드를 강제 종료하지 않음)"""
+        worker = getattr(self, worker_attr_name, None)
+        if worker is not None:
+            worker.token.cancel()
+            try:
+                worker.disconnect()
+            except (RuntimeError, TypeError):
+                pass  # 이미 끊긴 경우
+        setattr(self, worker_attr_name, None)
+
     # ----------------------------------------------------------
     def run_analysis(self):
         if not hasattr(self, "dicom_path"):
             self.log("❌ DICOM 폴더를 선택하세요.")
             return
         
-        # [수정됨] 새 분석 시작 전, 기존의 분석 스레드 AND 재예측 스레드 모두 청소
-        self.log("🧹 새 분석을 위해 메모리 정리 중...")
-        self.cleanup_thread('thread', 'worker')             # 메인 분석 스레드 정리
-        self.cleanup_thread('repredict_thread', 'repredict_worker') # 재예측 스레드도 정리
+        # 새 분석 시작 전, 진행 중인 분석 AND 재예측 작업 모두 취소
+        self.cancel_job('worker')
+        self.cancel_job('repredict_worker')
         
-        try:
-            self.patient_name = collect_patient_information(self.dicom_path)
-        except:
-            self.patient_name = "Unknown"
+        # 환자 이름은 워커가 header 인덱스를 만들면서 알려줌 (GUI 스레드에서 폴더를 읽지 않음)
+        self.patient_name = "Unknown"
 
         mode = self.mode_slider.value()
         threshold = 0.5 if mode == 0 else 0.3748581
 
-        self.log(f"=== 분석 시작: {self.patient_name} ===")
+        self.log(f"=== 분석 시작: {self.dicom_path} ===")
 
-        self.thread = QThread()
         self.worker = AnalysisWorker(self.dicom_path, threshold)
-        self.worker.moveToThread(self.thread)
 
         self.worker.log.connect(self.log)
+        self.worker.patient.connect(self.on_patient)
+        self.worker.progress.connect(self.on_progress)
         self.worker.error.connect(lambda e: self.log("오류: " + e))
         self.worker.finished.connect(self.on_finished)
 
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.thread.quit)
-        
-        # 스레드 종료 시 자동 삭제 예약
-        self.thread.finished.connect(self.thread.deleteLater)
-        self.worker.finished.connect(self.worker.deleteLater)
+        self.progress_bar.setValue(0)
+        self.jobs.submit(self.worker.run, priority=PRIORITY_ANALYSIS, name="analysis",
+                         token=self.worker.token)
 
-        self.thread.start()
+    def on_progress(self, percent, step):
+        self.progress_bar.setValue(percent)
+        self.progress_bar.setFormat(f"{step} %p%")
+
+    def on_patient(self, name):
+        self.patient_name = name
+        self.log(f"환자: {name}")
 
     # ----------------------------------------------------------
-    def on_finished(self, nifti, mask, top_features_df):
+    def on_finished(self, ct, mask, top_features_df):
         self.log("🎉 분석 완료! 영상 로드 중...")
-        self.nifti_path = nifti
-        self.load_volumes(nifti, mask)
+        # segmentation / radiomics 가 메모리를 다 돌려준 뒤에 리포트 모델을 미리 올림
+        get_report_service().preload()
+        self.ct_volume = ct
+        self.load_volumes(ct, mask)
         self.update_slice_view()
         
         # SHAP 그래프 팝업 표시
@@ -255,32 +277,97 @@ class RadiomicsAnalyzer(QWidget):
             dialog.exec()
 
     # ----------------------------------------------------------
-    def load_volumes(self, nifti_path, mask_path):
-        self.nifti_vol = nib.load(nifti_path).get_fdata()
-        self.mask_vol = nib.load(mask_path).get_fdata()
-
-        idx = np.where(self.mask_vol.sum(axis=(0, 1)) > 0)[0]
-        smin = max(0, idx.min() - 1)
-        smax = min(self.mask_vol.shape[2] - 1, idx.max() + 1)
-
-        self.slice_slider.setMinimum(smin)
-        self.slice_slider.setMaximum(smax)
-        self.slice_slider.setValue((smin + smax) // 2)
+    def load_volumes(self, ct, mask):
+        # CT 는 memory-map 된 원래 정수 dtype 그대로 (x, y, z) 뷰로 사용
+        # mask 는 편집해야 하므로 uint8 사본
+        self.nifti_vol = ct.xyz()
+        # 편집 기록이 mask 를 소유 (편집마다 바뀐 voxel 만 저장)
+        self.journal = MaskJournal(mask.xyz())
+        self.mask_vol = self.journal.mask
+        self.version_combo.clear()
+
+        self._release_renderer()
+        self.renderer = SliceRenderer(self.nifti_vol, self.mask_vol)
+        self.renderer.ready.connect(self.on_slice_rendered)
+        self.shown_sizes = {}
+
+        # 각 축마다 mask 가 있는 범위 (앞뒤 1 slice 여유) 안에서만 이동
+        for v, axis in SliceRenderer.AXES.items():
+            other = tuple(a for a in range(3) if a != axis)
+            idx = np.where(self.mask_vol.sum(axis=other) > 0)[0]
+            smin = max(0, idx.min() - 1)
+            smax = min(self.mask_vol.shape[axis] - 1, idx.max() + 1)
+            self.slice_ranges[v] = (smin, smax)
+            self.cursor[axis] = (smin + smax) // 2
+
+        self.change_view(self.current_view)
 
     # ----------------------------------------------------------
-    def on_wheel_slice(self, d):
-        v = self.slice_slider.value() + d
-        v = max(self.slice_slider.minimum(), min(self.slice_slider.maximum(), v))
-        self.slice_slider.setValue(v)
-
-    def on_zoom(self, s):
-        self.zoom_factor *= s
-        self.update_slice_view()
+    def clamp_slice(self, view, s):
+        smin, smax = self.slice_ranges[view]
+        return max(smin, min(smax, s))
+
+    def set_slice(self, view, s):
+        """view 의 slice 를 옮기고 바뀐 pane 만 다시 요청"""
+        s = self.clamp_slice(view, s)
+        axis = SliceRenderer.AXES[view]
+        if self.cursor[axis] == s:
+            return
+        self.cursor[axis] = s
+        if view == self.current_view:
+            self.slice_slider.blockSignals(True)
+            self.slice_slider.setValue(s)
+            self.slice_slider.blockSignals(False)
+        self.show_pane(view)
+        self.update_crosshairs()
+
+    def on_slider(self, s):
+        if self.renderer is not None:
+            self.set_slice(self.current_view, s)
+
+    def on_wheel_slice(self, view, d):
+        if self.renderer is not None:
+            self.set_slice(view, self.cursor[SliceRenderer.AXES[view]] + d)
+
+    def on_pane_clicked(self, view, pos):
+        """클릭한 지점으로 crosshair 를 옮겨 다른 두 pane 의 slice 를 맞춤"""
+        if self.renderer is None:
+            return
+        axis = SliceRenderer.AXES[view]
+        xyz = self.renderer.from_display(view, self.cursor[axis],
+                                         int(np.floor(pos.x())), int(np.floor(pos.y())))
+        for v, a in SliceRenderer.AXES.items():
+            if a != axis:
+                self.set_slice(v, xyz[a])
 
     # ----------------------------------------------------------
+    def highlight_active_pane(self):
+        for v, view in self.views.items():
+            border = "2px solid #4CAF50" if v == self.current_view else "1px solid #333"
+            view.setStyleSheet(f"background:black; border:{border};")
+
     def change_view(self, v):
+        """편집과 슬라이더가 따라갈 pane 을 바꿈"""
+        if self.edit_item.scene() is not None:
+            self.edit_item.scene().removeItem(self.edit_item)
+        self.edit_item.clear()
+        self.scenes[v].addItem(self.edit_item)
+        if v in self.shown_sizes:
+            self.edit_item.reset(*self.shown_sizes[v])
+
         self.current_view = v
-        self.update_slice_view()
+        self.viewer = self.views[v]
+        for vv, view in self.views.items():
+            view.set_edit_mode(self.edit_mode_btn.isChecked() and vv == v)
+        self.highlight_active_pane()
+
+        if self.renderer is not None:
+            smin, smax = self.slice_ranges[v]
+            self.slice_slider.blockSignals(True)
+            self.slice_slider.setRange(smin, smax)
+            self.slice_slider.setValue(self.cursor[SliceRenderer.AXES[v]])
+            self.slice_slider.blockSignals(False)
+            self.update_slice_view()
 
     # ----------------------------------------------------------
     def toggle_edit_mode(self, enabled):
@@ -293,46 +380,72 @@ class RadiomicsAnalyzer(QWidget):
     def clear_edits(self):
         self.edit_item.clear()
         self.log("🗑️ 편집 내용 취소")
+
+    def undo_edit(self):
+        if self.journal is None or self.journal.undo() is None:
+            self.log("❌ 되돌릴 편집이 없습니다.")
+            return
+        self.renderer.mask_changed()
+        self.update_slice_view()
+        self.log("↶ 편집 되돌림")
+
+    def redo_edit(self):
+        if self.journal is None or self.journal.redo() is None:
+            self.log("❌ 다시 실행할 편집이 없습니다.")
+            return
+        self.renderer.mask_changed()
+        self.update_slice_view()
+        self.log("↷ 편집 다시 실행")
+
+    def save_mask_version(self):
+        if self.journal is None:
+            self.log("❌ 저장할 마스크가 없습니다.")
+            return
+        default = f"v{len(self.journal.versions) + 1}"
+        name, ok = QInputDialog.getText(self, "마스크 버전 저장", "버전 이름:", text=default)
+        if not ok or not name:
+            return
+        if name not in self.journal.versions:
+            self.version_combo.addItem(name)
+        self.journal.save_version(name)
+        self.version_combo.setCurrentText(name)
+        self.log(f"💾 마스크 버전 저장: {name} (편집 기록 {self.journal.nbytes / 1024:.1f} KB)")
+
+    def restore_mask_version(self, name):
+        if self.journal is None or name not in self.journal.versions:
+            return
+        self.journal.restore_version(name)
+        self.renderer.mask_changed()
+        self.update_slice_view()
+        self.log(f"📂 마스크 버전 복원: {name}")
     
     def repredict(self):
-        if self.mask_vol is None or self.nifti_path is None:
+        if self.mask_vol is None or self.ct_volume is None:
             self.log("❌ 재예측할 데이터가 없습니다.")
             return
 
-        # [수정됨] 시작 전 무조건 이전 재예측 스레드 청소
-        self.log("🧹 메모리 정리 중...")
-        self.cleanup_thread('repredict_thread', 'repredict_worker')
+        # 시작 전 진행 중인 재예측은 취소
+        self.cancel_job('repredict_worker')
 
         mode = self.mode_slider.value()
         threshold = 0.5 if mode == 0 else 0.3748581
         
         self.log(f"=== 재예측 시작 (환자: {self.patient_name}) ===")
         
-        self.repredict_thread = QThread()
         self.repredict_worker = RepredictWorker(
-            self.nifti_path,
-            self.mask_vol.copy(),
+            self.ct_volume,
+            self.journal.snapshot(),
             self.patient_name or "Unknown",
             threshold
         )
-        self.repredict_worker.moveToThread(self.repredict_thread)
         
         self.repredict_worker.log.connect(self.log)
-        # 에러 발생 시 로그 찍고 스레드 종료
         self.repredict_worker.error.connect(lambda e: self.log(f"오류: {e}"))
-        self.repredict_worker.error.connect(self.repredict_thread.quit) 
-        
-        self.repredict_worker.finished.connect(self.repredict_thread.quit)
         self.repredict_worker.finished.connect(self.on_repredict_finished)
         
-        # 스레드 시작 시 워커 실행
-        self.repredict_thread.started.connect(self.repredict_worker.run)
-        
-        # 스레드가 끝나면 객체 삭제 예약 (중요)
-        self.repredict_thread.finished.connect(self.repredict_thread.deleteLater)
-        self.repredict_worker.finished.connect(self.repredict_worker.deleteLater)
-        
-        self.repredict_thread.start()
+        # 사용자가 기다리는 작업이므로 대기 중인 다른 작업보다 먼저 실행
+        self.jobs.submit(self.repredict_worker.run, priority=PRIORITY_INTERACTIVE,
+                         name="repredict", token=self.repredict_worker.token)
     
     def on_repredict_finished(self, top_features_df):
         """재예측 완료 후 SHAP 그래프 팝업 표시"""
@@ -348,8 +461,7 @@ class RadiomicsAnalyzer(QWidget):
             self.log("❌ 적용할 마스크가 없습니다.")
             return
 
-        edit_path = self.edit_item.get_merged_path()
-        if edit_path.isEmpty():
+        if not self.edit_item.has_edits():
             self.log("❌ 적용할 편집 내용이 없습니다.")
             return
 
@@ -367,66 +479,89 @@ class RadiomicsAnalyzer(QWidget):
         display_mask = np.rot90(current_mask)
         display_mask = np.fliplr(display_mask)
 
-        # Convert path to mask
-        edit_mask = path_to_mask(edit_path, display_mask.shape)
-
-        # Apply edit
-        edited_mask = apply_edit_to_mask(display_mask, edit_mask, self.edit_item.mode)
+        # Brush bitmap is already in display pixels
+        edited_mask = display_mask.copy()
+        edited_mask[self.edit_item.stroke] = 0 if self.edit_item.mode == "erase" else 1
 
         # Reverse transformations
         edited_mask = np.fliplr(edited_mask)
         edited_mask = np.rot90(edited_mask, k=-1)
 
-        # Update mask volume
+        # Update mask volume (journal keeps only the changed voxels for undo)
         if self.current_view == "axial":
-            self.mask_vol[:, :, s] = edited_mask
+            region = (slice(None), slice(None), s)
         elif self.current_view == "coronal":
-            self.mask_vol[:, s, :] = edited_mask
+            region = (slice(None), s, slice(None))
         else:
-            self.mask_vol[s, :, :] = edited_mask
+            region = (s, slice(None), slice(None))
+        n_changed = self.journal.commit(region, edited_mask,
+                                        label=f"{self.current_view} {s}")
 
+        self.renderer.mask_changed()
         self.edit_item.clear()
         self.update_slice_view()
-        self.log("✅ 편집 적용 완료")
+        self.log(f"✅ 편집 적용 완료 ({n_changed} voxel)")
 
     # ----------------------------------------------------------
     def update_slice_view(self):
+        """세 pane 모두 현재 crosshair 위치의 slice 로 갱신"""
         if self.nifti_vol is None:
             return
-
-        s = self.slice_slider.value()
-
-        if self.current_view == "axial":
-            img = np.rot90(self.nifti_vol[:, :, s])
-            mask = np.rot90(self.mask_vol[:, :, s])
-        elif self.current_view == "coronal":
-            img = np.rot90(self.nifti_vol[:, s, :])
-            mask = np.rot90(self.mask_vol[:, s, :])
-        else:
-            img = np.rot90(self.nifti_vol[s, :, :])
-            mask = np.rot90(self.mask_vol[s, :, :])
-        
-        img = np.fliplr(img)
-        mask = np.fliplr(mask)
-        
-        mask_edge = np.logical_xor(mask > 0, binary_erosion(mask > 0))
-
-        # Normalize
-        img_norm = (img - img.min()) / (img.max() - img.min() + 1e-6)
-        img_uint8 = (img_norm * 255).astype(np.uint8)
-
-        overlay = np.stack([img_uint8, img_uint8, img_uint8], axis=-1)
-        overlay[mask_edge] = [255, 0, 0]
-
-        h, w, _ = overlay.shape
-        qimg = QImage(overlay.data, w, h, 3 * w, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(qimg)
-
-        pixmap = pixmap.scaled(
-            int(w * self.zoom_factor), int(h * self.zoom_factor),
-            Qt.KeepAspectRatio, Qt.SmoothTransformation
-        )
-
-        self.pixmap_item.setPixmap(pixmap)
-        self.scene.setSceneRect(self.pixmap_item.boundingRect())
-        self.viewer.fitInView(self.pixmap_item, Qt.KeepAspectRatio)
+        for v in SliceRenderer.AXES:
+            self.show_pane(v)
+        self.update_crosshairs()
+
+    def show_pane(self, view):
+        # 캐시에 있으면 바로 올리고, 없으면 렌더링 스레드가 끝낸 뒤 on_slice_rendered 로 옴
+        s = self.cursor[SliceRenderer.AXES[view]]
+        qimg = self.renderer.request(view, s, *self.slice_ranges[view])
+        if qimg is not None:
+            self.blit(view, qimg)
+
+    def _release_renderer(self):
+        """이전 영상의 렌더러를 멈추고 ready 시그널을 끊음"""
+        if self.renderer is None:
+            return
+        try:
+            self.renderer.ready.disconnect(self.on_slice_rendered)
+        except (RuntimeError, TypeError):
+            pass
+        self.renderer.close()
+        self.renderer = None
+
+    def on_slice_rendered(self, view, s, qimg):
+        # 끊기 전에 이미 큐에 들어간 이전 렌더러의 결과는 무시
+        if self.sender() is not self.renderer:
+            return
+        if self.cursor[SliceRenderer.AXES[view]] == s:
+            self.blit(view, qimg)
+
+    def blit(self, view, qimg):
+        # 원래 해상도 그대로 올리고 zoom/pan 은 viewer transform 이 담당
+        # (scene 좌표 = slice 픽셀 좌표라 편집 경로도 그대로 mask 에 대응)
+        item = self.pixmap_items[view]
+        item.setPixmap(QPixmap.fromImage(qimg))
+
+        size = (qimg.width(), qimg.height())
+        if size != self.shown_sizes.get(view):
+            # 새 영상일 때만 화면에 맞춤 (스크롤 중 배율 유지)
+            self.shown_sizes[view] = size
+            self.scenes[view].setSceneRect(item.boundingRect())
+            if view == self.current_view:
+                self.edit_item.reset(*size)
+            self.views[view].fit_to(item)
+
+    def update_crosshairs(self):
+        for v, (vline, hline) in self.crosshairs.items():
+            col, row = self.renderer.to_display(v, self.cursor)
+            w, h = self.renderer.plane_shape(v)
+            vline.setLine(col + 0.5, 0, col + 0.5, h)
+            hline.setLine(0, row + 0.5, w, row + 0.5)
+            vline.setVisible(True)
+            hline.setVisible(True)
+
+    def closeEvent(self, event):
+        self._release_renderer()
+        # 진행 중인 작업에 취소를 알림 (실행기 스레드는 daemon)
+        self.jobs.cancel_all()
+        super().closeEvent(event)
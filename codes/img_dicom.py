@@ -1,22 +1,48 @@
 class ImageView(QGraphicsView):
     wheel_slice = Signal(int)
     wheel_zoom = Signal(float)
+    clicked = Signal(QPointF)  # 보기 모드에서 끌지 않고 클릭한 scene 좌표
+
+    MIN_ZOOM = 0.5
+    MAX_ZOOM = 20.0
 
     def __init__(self, scene, edit_item):
         super().__init__(scene)
         self.edit_item = edit_item
         self.drawing = False
         self.edit_enabled = False
+        self.zoom = 1.0  # 화면 맞춤 대비 배율
+        self._press_pos = None
 
         self.setRenderHint(QPainter.Antialiasing)
         self.setRenderHint(QPainter.SmoothPixmapTransform)
 
+        # zoom/pan 은 view transform 으로 처리 (pixmap 은 원래 해상도 그대로)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setResizeAnchor(QGraphicsView.AnchorViewCenter)
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+
     def set_edit_mode(self, enabled):
         self.edit_enabled = enabled
+        # 편집 중에는 드래그가 브러시이므로 pan 을 끔
+        self.setDragMode(QGraphicsView.NoDrag if enabled else QGraphicsView.ScrollHandDrag)
+
+    def fit_to(self, item):
+        """item 전체가 보이도록 맞추고 배율 초기화"""
+        self.resetTransform()
+        self.fitInView(item, Qt.KeepAspectRatio)
+        self.zoom = 1.0
+
+    def zoom_by(self, factor):
+        factor = max(self.MIN_ZOOM / self.zoom, min(self.MAX_ZOOM / self.zoom, factor))
+        self.scale(factor, factor)
+        self.zoom *= factor
+        self.wheel_zoom.emit(self.zoom)
 
     def wheelEvent(self, event):
         if event.modifiers() == Qt.ControlModifier:
-            self.wheel_zoom.emit(1.1 if event.angleDelta().y() > 0 else 0.9)
+            # 커서 아래 지점을 기준으로 확대/축소
+            self.zoom_by(1.1 if event.angleDelta().y() > 0 else 0.9)
         else:
             self.wheel_slice.emit(+1 if event.angleDelta().y() > 0 else -1)
 
@@ -25,6 +51,7 @@ class ImageView(QGraphicsView):
             self.edit_item.start_draw(self.mapToScene(event.position().toPoint()))
             self.drawing = True
         else:
+            self._press_pos = event.position().toPoint()
             super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event):
@@ -38,4 +65,9 @@ class ImageView(QGraphicsView):
             self.edit_item.end_draw()
             self.drawing = False
         else:
+            pos = event.position().toPoint()
+            # pan 으로 끈 것이 아니면 crosshair 이동으로 처리
+            if self._press_pos is not None and (pos - self._press_pos).manhattanLength() < 4:
+                self.clicked.emit(self.mapToScene(pos))
+            self._press_pos = None
             super().mouseReleaseEvent(event)
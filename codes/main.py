@@ -3,7 +3,14 @@ import os
 import numpy as np
 import nibabel as nib
 import traceback
-from scipy.ndimage import binary_erosion
+import time
+import threading
+import gc
+import copy
+import random
+from collections import OrderedDict
+from contextlib import contextmanager
+from scipy.ndimage import binary_erosion, generate_binary_structure
 
 if sys.stdout is None:
     sys.stdout = open(os.devnull, "w")
@@ -11,15 +18,16 @@ if sys.stderr is None:
     sys.stderr = open(os.devnull, "w")
 
 from PySide6.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QHBoxLayout,
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
     QGroupBox, QPushButton, QLabel, QFileDialog,
     QSlider, QPlainTextEdit, QGraphicsView, QGraphicsScene,
-    QGraphicsPixmapItem, QGraphicsPathItem, QRadioButton, QButtonGroup,
-    QDialog
+    QGraphicsPixmapItem, QGraphicsPathItem, QGraphicsItem, QRadioButton, QButtonGroup,
+    QDialog, QComboBox, QInputDialog, QProgressBar
 )
-from PySide6.QtCore import Qt, Signal, QObject, QThread, QPointF
+from PySide6.QtCore import Qt, Signal, QObject, QThread, QPointF, QRectF
 from PySide6.QtGui import (
-    QPixmap, QImage, QPainterPath, QPen, QBrush, QPainter
+    QPixmap, QImage, QPainterPath, QPen, QBrush, QPainter, QColor, QShortcut, QKeySequence,
+    QTextCursor
 )
 import multiprocessing
 import matplotlib
@@ -38,11 +46,26 @@ def resource_path(relative_path):
 from ras_converter import dicom_to_nifti_ras
 from totalsegmentation import run_TS
 from patient_information_collection import collect_patient_information
-from radiomics_extr import extract_radiomics
+from dicom_index import get_index
+from radiomics_extr import extract_radiomics, EXTRACT_WORKERS
+from filter_cache import get_filter_cache
+from jobs import (
+    get_job_executor, CancelToken, JobCancelled,
+    PRIORITY_INTERACTIVE, PRIORITY_ANALYSIS, PRIORITY_REPORT
+)
+from artifact_store import (
+    get_artifact_store, cached_convert, cached_segment, cached_extract, cached_predict,
+    get_report_store, report_key, lookup_report, save_report,
+    set_latest_report, latest_report
+)
 from testor1 import predict_with_model
 
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import (
+    AutoConfig, AutoTokenizer, AutoModelForCausalLM, TextIteratorStreamer,
+    StoppingCriteria, StoppingCriteriaList, DynamicCache
+)
 import torch
+from accelerate import init_empty_weights
 import pandas as pd
 import json
 from typing import Optional, Dict, List
@@ -50,6 +73,11 @@ import traceback
 from matplotlib.patches import Patch
 import tempfile
 
+try:
+    import psutil  # 있으면 리포트 모델 메모리 예산 확인에 사용
+except ImportError:
+    psutil = None
+
 if __name__ == "__main__":
     multiprocessing.freeze_support()
     if len(sys.argv) > 1 and sys.argv[1] == "--prevent-loop":
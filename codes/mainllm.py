@@ -1,8 +1,85 @@
+class _CancelCriteria(StoppingCriteria):
+    """CancelToken 이 취소되면 다음 토큰에서 generate 를 멈춤"""
+
+    def __init__(self, token):
+        self.token = token
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.token.cancelled,
+                          dtype=torch.bool, device=input_ids.device)
+
+
+def format_generation_stats(stats):
+    ttft = stats.get("ttft_s")
+    ttft_text = f"{ttft:.1f}s" if ttft is not None else "-"
+    return (f"⏱️ first token {ttft_text}, {stats['tokens']} tokens, "
+            f"{stats['tokens_per_s']:.1f} tok/s")
+
+
+REPORT_MODEL = "BioMistral/BioMistral-7B"
+
+# 프롬프트 구성이 바뀌면 올림 (저장된 리포트와 구분하는 용도)
+PROMPT_VERSION = 2
+
+# 모든 리포트에 공통인 지시문. 환자별 SHAP 요약은 이 뒤에 붙음
+REPORT_INSTRUCTIONS = """You are a professional professor in radiology and an expert in radiomics analysis. Based on the SHAP analysis results with detailed feature definitions given at the end, generate a comprehensive radiological interpretation report for detecting Pancreatic Disease.
+
+Please provide a detailed report with the following sections:
+
+0. Skip the definition of Radiomics or something that isn't unnecessary for interpretation which spents the tokens.
+
+1. **Feature Summary**: Summarize the most important radiomics features and their SHAP values. Explain what these features represent in radiological terms using the provided definitions.
+
+2. **Clinical Interpretation**: Provide a detailed clinical interpretation of these features. Explain:
+   - What each feature indicates about the tissue characteristics
+   - How these features relate to normal vs abnormal pancreatic tissue
+   - The significance of positive vs negative SHAP contributions
+
+3. **Diagnostic Implications**: Discuss:
+   - What these radiomics patterns suggest about the patient's condition
+   - Any specific imaging characteristics that support the diagnosis
+   - Confidence level in the analysis
+
+4. **Clinical Reasoning**: Explain in detail why the patient appears to be Normal, based on:
+   - The combination of radiomics features
+   - The balance of positive and negative contributions
+   - Typical patterns seen in normal pancreatic tissue
+
+5. **Final Diagnosis**: Conclude with a clear statement: 'Final Diagnosis: Normal' or 'Final Diagnosis: Abnormal'
+
+Generate a comprehensive, medically sound report that would be useful for clinical decision-making.
+
+"""
+
+
+def report_model_dtype(device):
+    return torch.float16 if device == "cuda" else torch.float32
+
+
+def estimate_model_bytes(model_name: str = REPORT_MODEL, device: Optional[str] = None,
+                         margin: float = 1.2) -> int:
+    """
+    모델을 올리는 데 필요한 메모리 추정치 (파라미터 수 × dtype 크기 × margin)
+
+    파라미터 수는 config 로 빈(meta) 모델을 만들어 세므로 가중치는 읽지 않음
+    """
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    config = AutoConfig.from_pretrained(model_name)
+    with init_empty_weights():
+        model = AutoModelForCausalLM.from_config(config)
+    n_params = sum(p.numel() for p in model.parameters())
+    bytes_per_param = torch.empty((), dtype=report_model_dtype(device)).element_size()
+    return int(n_params * bytes_per_param * margin)
+
+
 class BioMistralReportGenerator:
     
-    def __init__(self, model_name: str = "BioMistral/BioMistral-7B", dictionary_path: str = r'c:\Users\RaPhyA\Desktop\Nous\assets\word_dictionary.json'):
+    def __init__(self, model_name: str = REPORT_MODEL, dictionary_path: str = r'c:\Users\RaPhyA\Desktop\Nous\assets\word_dictionary.json'):
   
+        self.model_name = model_name
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.last_stats = {}
+        self._prefix_cache = None  # (공통 지시문 token id, 그 KV cache)
     
         # Feature dictionary 로드
         self.feature_dictionary = self.load_dictionary(dictionary_path)
@@ -13,7 +90,7 @@ class BioMistralReportGenerator:
         # 모델 로드
         self.model = AutoModelForCausalLM.from_pretrained(
             model_name, 
-            torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
+            torch_dtype=report_model_dtype(self.device),
             device_map="auto", 
             offload_folder=r"c:\Users\RaPhyA\Desktop\새 폴더 (2)",
             low_cpu_mem_usage=True
@@ -88,6 +165,50 @@ class BioMistralReportGenerator:
         
         return text
     
+    def build_prompt(self, shap_df: pd.DataFrame, top_n: int = 10) -> str:
+        """SHAP DataFrame → 리포트 생성 프롬프트"""
+        # SHAP 데이터를 텍스트로 변환 (정의 포함)
+        shap_text = self.shap_df_to_text(shap_df, top_n, include_definitions=True)
+        
+        # 고정 지시문을 앞에 두고 환자마다 바뀌는 SHAP 요약은 맨 뒤에 붙임
+        # (앞부분의 KV cache 를 리포트마다 재사용하기 위함)
+        prompt = f"{REPORT_INSTRUCTIONS}{shap_text}\nReport:"
+        return prompt
+
+    def _prefix_ids(self):
+        # chat template 을 씌운 프롬프트에서 공통 지시문까지의 token id
+        text = self.tokenizer.apply_chat_template(
+            [{"role": "user", "content": REPORT_INSTRUCTIONS + "\x00"}],
+            add_generation_prompt=True,
+            tokenize=False,
+        )
+        head = text[:text.index("\x00")]
+        return self.tokenizer(head, add_special_tokens=False)["input_ids"]
+
+    def prefix_cache(self, input_ids):
+        """
+        input_ids 가 공통 지시문으로 시작하면 그 부분의 KV cache 복사본, 아니면 None
+
+        지시문의 cache 는 처음 한 번만 계산하고, generate 가 cache 에 이어 쓰므로
+        리포트마다 deepcopy 해서 넘김
+        """
+        if self._prefix_cache is None:
+            ids = self._prefix_ids()
+            with torch.no_grad():
+                out = self.model(
+                    input_ids=torch.tensor([ids], device=self.model.device),
+                    past_key_values=DynamicCache(),
+                    use_cache=True,
+                )
+            self._prefix_cache = (ids, out.past_key_values)
+
+        ids, cache = self._prefix_cache
+        n = len(ids)
+        # 경계에서 토큰이 다르게 나뉘면 재사용하지 않음 (남는 토큰이 하나는 있어야 함)
+        if input_ids.shape[-1] <= n or input_ids[0, :n].tolist() != ids:
+            return None
+        return copy.deepcopy(cache)
+
     def generate_report(
         self, 
         shap_df: pd.DataFrame,
@@ -95,7 +216,10 @@ class BioMistralReportGenerator:
         top_n: int = 10,
         max_tokens: int = 2048,
         temperature: float = 0.7,
-        log_callback: Optional[callable] = None
+        log_callback: Optional[callable] = None,
+        stream_callback: Optional[callable] = None,
+        cancel_token=None,
+        seed: Optional[int] = None
     ) -> str:
         """
         SHAP DataFrame으로부터 방사선학 리포트 생성
@@ -106,54 +230,18 @@ class BioMistralReportGenerator:
             top_n: 상위 몇 개의 feature를 사용할지
             max_tokens: 생성할 최대 토큰 수
             temperature: 생성 온도 (높을수록 창의적)
+            stream_callback: 토큰이 나올 때마다 텍스트 조각을 받는 함수 (선택)
+            cancel_token: CancelToken - 취소되면 다음 토큰에서 생성 중단
+            seed: 주면 같은 입력에 같은 리포트가 나오도록 sampling 시드 고정
         
         Returns:
-            생성된 방사선학 리포트
+            생성된 방사선학 리포트 (속도는 self.last_stats 에 기록)
         """
-        # 외부 dictionary가 없으면 내부 dictionary 사용
-        if feature_dictionary is None:
-            feature_dictionary = self.feature_dictionary
-        
-        # SHAP 데이터를 텍스트로 변환 (정의 포함)
-        shap_text = self.shap_df_to_text(shap_df, top_n, include_definitions=True)
-        
-        # 추가 Feature dictionary 정보 (필요시)
-        dict_text = ""
-        # 이미 shap_df_to_text에서 정의를 포함했으므로, 여기서는 생략하거나
-        # 추가적인 일반적 설명을 넣을 수 있음
-        
-        # 프롬프트 구성 (더 상세하고 풍부한 리포트를 위한 프롬프트)
-        prompt = f"""You are a professional professor in radiology and an expert in radiomics analysis. Based on the following SHAP analysis results with detailed feature definitions, generate a comprehensive radiological interpretation report for detecting Pancreatic Disease.
+        if seed is not None:
+            torch.manual_seed(seed)
 
-{shap_text}
+        prompt = self.build_prompt(shap_df, top_n)
 
-Please provide a detailed report with the following sections:
-
-0. Skip the definition of Radiomics or something that isn't unnecessary for interpretation which spents the tokens.
-
-1. **Feature Summary**: Summarize the most important radiomics features and their SHAP values. Explain what these features represent in radiological terms using the provided definitions.
-
-2. **Clinical Interpretation**: Provide a detailed clinical interpretation of these features. Explain:
-   - What each feature indicates about the tissue characteristics
-   - How these features relate to normal vs abnormal pancreatic tissue
-   - The significance of positive vs negative SHAP contributions
-
-3. **Diagnostic Implications**: Discuss:
-   - What these radiomics patterns suggest about the patient's condition
-   - Any specific imaging characteristics that support the diagnosis
-   - Confidence level in the analysis
-
-4. **Clinical Reasoning**: Explain in detail why the patient appears to be Normal, based on:
-   - The combination of radiomics features
-   - The balance of positive and negative contributions
-   - Typical patterns seen in normal pancreatic tissue
-
-5. **Final Diagnosis**: Conclude with a clear statement: 'Final Diagnosis: Normal' or 'Final Diagnosis: Abnormal'
-
-Generate a comprehensive, medically sound report that would be useful for clinical decision-making.
-
-Report:"""
-        
         # 메시지 형식으로 변환
         messages = [
             {"role": "user", "content": prompt}
@@ -170,7 +258,7 @@ Report:"""
         
         # 텍스트 생성
         print("Generating radiological report...")
-        outputs = self.model.generate(
+        gen_kwargs = dict(
             **inputs,
             max_new_tokens=max_tokens,
             do_sample=True,
@@ -178,12 +266,55 @@ Report:"""
             top_p=0.95,
             pad_token_id=self.tokenizer.eos_token_id
         )
-        
+        if cancel_token is not None:
+            gen_kwargs["stopping_criteria"] = StoppingCriteriaList([_CancelCriteria(cancel_token)])
+
+        start = time.perf_counter()
+        cache = self.prefix_cache(inputs["input_ids"])
+        if cache is not None:
+            gen_kwargs["past_key_values"] = cache
+        first_token = None
+        if stream_callback is None:
+            outputs = self.model.generate(**gen_kwargs)
+        else:
+            # generate 는 별도 스레드에서 돌리고 여기서는 나오는 토큰을 바로 넘김
+            streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True,
+                                            skip_special_tokens=True)
+            result = {}
+
+            def run_generate():
+                try:
+                    result["outputs"] = self.model.generate(**gen_kwargs, streamer=streamer)
+                except Exception as e:
+                    result["error"] = e
+                    streamer.end()
+
+            thread = threading.Thread(target=run_generate, daemon=True)
+            thread.start()
+            for text in streamer:
+                if text and first_token is None:
+                    first_token = time.perf_counter()
+                stream_callback(text)
+            thread.join()
+            if "error" in result:
+                raise result["error"]
+            outputs = result["outputs"]
+
+        elapsed = time.perf_counter() - start
+        new_tokens = outputs[0][inputs["input_ids"].shape[-1]:]
+        self.last_stats = {
+            "ttft_s": (first_token - start) if first_token is not None else None,
+            "tokens": int(new_tokens.shape[-1]),
+            "tokens_per_s": new_tokens.shape[-1] / elapsed if elapsed > 0 else 0.0,
+        }
+        if log_callback:
+            log_callback(format_generation_stats(self.last_stats))
+
+        if cancel_token is not None:
+            cancel_token.check()
+
         # 결과 디코딩
-        response = self.tokenizer.decode(
-            outputs[0][inputs["input_ids"].shape[-1]:], 
-            skip_special_tokens=True
-        )
+        response = self.tokenizer.decode(new_tokens, skip_special_tokens=True)
         
         return response.strip()
     
@@ -191,13 +322,104 @@ Report:"""
         self,
         shap_df_list: List[pd.DataFrame],
         feature_dictionary: Optional[Dict[str, str]] = None,
-        **kwargs
+        top_n: int = 10,
+        max_tokens: int = 2048,
+        temperature: float = 0.7,
+        seed: Optional[int] = 0,
+        max_batch_size: int = 8,
+        max_batch_tokens: int = 16384,
+        log_callback: Optional[callable] = None,
+        cancel_token=None
     ) -> List[str]:
- 
-        reports = []
-        for i, shap_df in enumerate(shap_df_list):
-            print(f"\nGenerating report {i+1}/{len(shap_df_list)}...")
-            report = self.generate_report(shap_df, feature_dictionary, **kwargs)
-            reports.append(report)
-        
+        """
+        여러 환자의 리포트를 배치 단위 generate 로 한꺼번에 생성
+
+        프롬프트 길이가 비슷한 것끼리 묶어 왼쪽 padding 하고, 배치마다
+        (프롬프트 길이 + max_tokens) × 배치 크기가 max_batch_tokens 를 넘지 않게 나눔.
+        배치 구성은 입력만으로 정해지고 배치마다 seed 를 다시 걸므로 같은 입력이면
+        같은 결과가 나옴 (다만 한 장씩 generate_report 로 만든 결과와는 다를 수 있음)
+
+        Returns:
+            shap_df_list 순서대로의 리포트 목록
+        """
+        if not shap_df_list:
+            return []
+
+        tokenizer = self.tokenizer
+        pad_id = tokenizer.pad_token_id
+        if pad_id is None:
+            pad_id = tokenizer.eos_token_id
+
+        encoded = [
+            tokenizer.apply_chat_template(
+                [{"role": "user", "content": self.build_prompt(df, top_n)}],
+                add_generation_prompt=True,
+                tokenize=True,
+            )
+            for df in shap_df_list
+        ]
+
+        # 길이순으로 정렬해 padding 을 줄이고, 메모리 한도 안에서 배치를 채움
+        order = sorted(range(len(encoded)), key=lambda i: len(encoded[i]))
+        batches, current = [], []
+        for i in order:
+            width = len(encoded[i]) + max_tokens  # 정렬되어 있으므로 i 가 가장 김
+            if current and (len(current) >= max_batch_size
+                            or (len(current) + 1) * width > max_batch_tokens):
+                batches.append(current)
+                current = []
+            current.append(i)
+        batches.append(current)
+
+        reports = [None] * len(encoded)
+        done = 0
+        for b, batch in enumerate(batches):
+            if cancel_token is not None:
+                cancel_token.check()
+            print(f"\nGenerating reports {done + 1}-{done + len(batch)}/{len(encoded)} "
+                  f"(batch {b + 1}/{len(batches)})...")
+
+            length = max(len(encoded[i]) for i in batch)
+            input_ids = torch.full((len(batch), length), pad_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(batch), length), dtype=torch.long)
+            for row, i in enumerate(batch):
+                ids = encoded[i]
+                input_ids[row, length - len(ids):] = torch.tensor(ids, dtype=torch.long)
+                attention_mask[row, length - len(ids):] = 1
+
+            gen_kwargs = dict(
+                input_ids=input_ids.to(self.model.device),
+                attention_mask=attention_mask.to(self.model.device),
+                max_new_tokens=max_tokens,
+                do_sample=True,
+                temperature=temperature,
+                top_p=0.95,
+                pad_token_id=pad_id
+            )
+            if cancel_token is not None:
+                gen_kwargs["stopping_criteria"] = StoppingCriteriaList([_CancelCriteria(cancel_token)])
+            if seed is not None:
+                torch.manual_seed(seed + b)
+
+            start = time.perf_counter()
+            outputs = self.model.generate(**gen_kwargs)
+            elapsed = time.perf_counter() - start
+
+            new_tokens = outputs[:, length:]
+            texts = tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+            for i, text in zip(batch, texts):
+                reports[i] = text.strip()
+
+            n_tokens = int((new_tokens != pad_id).sum())
+            self.last_stats = {
+                "ttft_s": None,
+                "tokens": n_tokens,
+                "tokens_per_s": n_tokens / elapsed if elapsed > 0 else 0.0,
+            }
+            if log_callback:
+                log_callback(format_generation_stats(self.last_stats))
+            done += len(batch)
+
+        if cancel_token is not None:
+            cancel_token.check()
         return reports
@@ -0,0 +1,142 @@
+class MaskDelta:
+    """한 번의 편집으로 바뀐 voxel (flat index + 이전/이후 값)"""
+
+    __slots__ = ("label", "idx", "old", "new")
+
+    def __init__(self, label, idx, old, new):
+        self.label = label
+        self.idx = idx
+        self.old = old
+        self.new = new
+
+    @property
+    def nbytes(self):
+        return self.idx.nbytes + self.old.nbytes + self.new.nbytes
+
+
+class MaskJournal:
+    """
+    mask 편집 기록 (undo / redo / 이름 붙인 버전)
+
+    mask 는 제자리에서 수정하고, 편집마다 바뀐 voxel 만 MaskDelta 로 남김.
+    버전은 그 시점의 delta 목록(공유 객체)이라 전체 복사본을 만들지 않음
+    """
+
+    def __init__(self, mask):
+        self.mask = np.ascontiguousarray(mask, dtype=np.uint8)
+        self._flat = self.mask.reshape(-1)
+        self._index_dtype = np.int32 if self._flat.size < 2 ** 31 else np.int64
+
+        self._done = []   # 적용된 delta (undo 순서)
+        self._undone = []  # undo 된 delta (redo 순서)
+        self.versions = {}
+        self._snapshot = None
+
+    # ----------------------------------------------------------
+    def commit(self, region, new_values, label="edit"):
+        """
+        mask[region] 을 new_values 로 바꾸고 바뀐 voxel 만 기록
+
+        region 은 축마다 int 또는 slice 인 3-tuple (예: (slice(None), slice(None), s))
+
+        Returns:
+            바뀐 voxel 수 (0 이면 기록하지 않음)
+        """
+        view = self.mask[region]
+        new_values = np.asarray(new_values, dtype=np.uint8)
+        changed = view != new_values
+        if not changed.any():
+            return 0
+
+        idx = self._flat_index(region, np.nonzero(changed))
+        delta = MaskDelta(label, idx, view[changed].copy(), new_values[changed].copy())
+
+        self._flat[idx] = delta.new
+        self._done.append(delta)
+        self._undone.clear()
+        self._snapshot = None
+        return len(idx)
+
+    def _flat_index(self, region, local):
+        # region 안의 좌표를 전체 volume 의 flat index 로 변환
+        n = len(local[0])
+        coords = []
+        axis_in_view = 0
+        for axis, r in enumerate(region):
+            if isinstance(r, slice):
+                start, _, step = r.indices(self.mask.shape[axis])
+                coords.append(start + step * local[axis_in_view])
+                axis_in_view += 1
+            else:
+                coords.append(np.full(n, r))
+        return np.ravel_multi_index(coords, self.mask.shape).astype(self._index_dtype)
+
+    def undo(self):
+        if not self._done:
+            return None
+        delta = self._done.pop()
+        self._flat[delta.idx] = delta.old
+        self._undone.append(delta)
+        self._snapshot = None
+        return delta.label
+
+    def redo(self):
+        if not self._undone:
+            return None
+        delta = self._undone.pop()
+        self._flat[delta.idx] = delta.new
+        self._done.append(delta)
+        self._snapshot = None
+        return delta.label
+
+    def can_undo(self):
+        return bool(self._done)
+
+    def can_redo(self):
+        return bool(self._undone)
+
+    # ----------------------------------------------------------
+    def save_version(self, name):
+        self.versions[name] = tuple(self._done)
+
+    def restore_version(self, name):
+        """공통 기록까지 되돌린 뒤 그 버전의 delta 를 다시 적용"""
+        target = self.versions[name]
+
+        common = 0
+        for a, b in zip(self._done, target):
+            if a is not b:
+                break
+            common += 1
+
+        while len(self._done) > common:
+            delta = self._done.pop()
+            self._flat[delta.idx] = delta.old
+        for delta in target[common:]:
+            self._flat[delta.idx] = delta.new
+            self._done.append(delta)
+
+        self._undone.clear()
+        self._snapshot = None
+
+    # ----------------------------------------------------------
+    def snapshot(self):
+        """
+        워커에 넘길 읽기 전용 mask (z, y, x 순서 uint8)
+
+        편집이 없으면 같은 배열을 재사용하므로 재예측을 반복해도 복사는 한 번
+        """
+        if self._snapshot is None:
+            snap = np.ascontiguousarray(self.mask.transpose(2, 1, 0))
+            snap.setflags(write=False)
+            self._snapshot = snap
+        return self._snapshot
+
+    @property
+    def nbytes(self):
+        """기록이 차지하는 메모리 (mask 자체 제외)"""
+        seen = {}
+        for delta in (*self._done, *self._undone,
+                      *(d for v in self.versions.values() for d in v)):
+            seen[id(delta)] = delta.nbytes
+        return sum(seen.values())
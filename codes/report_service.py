@@ -0,0 +1,169 @@
+class ReportGeneratorService:
+    """
+    앱 전체에서 하나만 두는 BioMistral 리포트 생성기
+
+    분석이 끝나면 백그라운드에서 미리 올려 두고, 다이얼로그가 바뀌어도
+    같은 모델을 계속 사용. idle_timeout 동안 쓰지 않으면 내려서 메모리를 돌려줌.
+    psutil 이 있으면 남은 메모리가 memory_budget (기본은 모델 config 와 dtype 으로
+    계산) 보다 적을 때는 미리 올리지 않음
+    """
+
+    def __init__(self, idle_timeout=30 * 60, memory_budget=None,
+                 low_memory=2 * 1024 ** 3, check_interval=30):
+        self.idle_timeout = idle_timeout
+        self.memory_budget = memory_budget  # 모델이 차지할 것으로 보는 메모리 (None 이면 계산)
+        self.low_memory = low_memory        # 쉬는 중에 이보다 적게 남으면 내림
+        self.check_interval = check_interval
+
+        self._generator = None
+        self._loading = None  # 로딩 중이면 완료 Event
+        self._error = None
+        self._users = 0
+        self._last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+        threading.Thread(target=self._idle_loop, daemon=True).start()
+
+    # ----------------------------------------------------------
+    @staticmethod
+    def available_memory():
+        """남은 시스템 메모리 (psutil 이 없으면 None)"""
+        if psutil is None:
+            return None
+        return psutil.virtual_memory().available
+
+    @property
+    def loaded(self):
+        return self._generator is not None
+
+    def budget(self):
+        """모델 적재에 필요한 메모리 (계산할 수 없으면 None)"""
+        if self.memory_budget is None:
+            try:
+                self.memory_budget = estimate_model_bytes()
+            except Exception:
+                traceback.print_exc()
+                return None
+        return self.memory_budget
+
+    def preload(self):
+        """
+        모델을 백그라운드에서 올리기 시작 (이미 올렸거나 올리는 중이면 아무것도 안 함)
+
+        메모리 확인도 백그라운드에서 하고, 부족하면 올리지 않고 다음 get() 에서 올림
+        """
+        with self._lock:
+            if self._generator is not None or self._loading is not None:
+                return
+            self._loading = threading.Event()
+        threading.Thread(target=self._preload, daemon=True).start()
+
+    def _preload(self):
+        free = self.available_memory()
+        budget = self.budget() if free is not None else None
+        if free is not None and (budget is None or free < budget):
+            need = f"{budget / 1024 ** 3:.1f} GB" if budget is not None else "알 수 없음"
+            print(f"⚠️ 메모리가 부족해 리포트 모델을 미리 올리지 않습니다 "
+                  f"({free / 1024 ** 3:.1f} GB 남음, 필요 {need})")
+            with self._lock:
+                done, self._loading = self._loading, None
+            done.set()
+            return
+        self._load()
+
+    def _load(self):
+        try:
+            generator = BioMistralReportGenerator()
+            error = None
+        except Exception as e:
+            traceback.print_exc()
+            generator, error = None, e
+
+        with self._lock:
+            self._generator = generator
+            self._error = error
+            self._last_used = time.monotonic()
+            done, self._loading = self._loading, None
+        done.set()
+
+    def get(self, log_callback=None):
+        """올라온 생성기 (필요하면 로딩이 끝날 때까지 기다림)"""
+        while True:
+            with self._lock:
+                if self._generator is not None:
+                    return self._generator
+                loading = self._loading
+            if loading is None:
+                if log_callback:
+                    log_callback("🔄 Loading BioMistral model (First run takes time)...")
+                    free, budget = self.available_memory(), self.memory_budget
+                    if free is not None and budget is not None and free < budget:
+                        log_callback(f"⚠️ 남은 메모리 {free / 1024 ** 3:.1f} GB < 필요 "
+                                     f"{budget / 1024 ** 3:.1f} GB - 느려지거나 실패할 수 있습니다")
+                # 메모리 예산과 관계없이 사용자가 요청한 경우는 올림
+                with self._lock:
+                    if self._loading is None and self._generator is None:
+                        self._loading = threading.Event()
+                        start = True
+                    else:
+                        start = False
+                if start:
+                    self._load()
+            else:
+                if log_callback:
+                    log_callback("⏳ Waiting for BioMistral model to finish loading...")
+                loading.wait()
+
+            with self._lock:
+                if self._generator is None and self._error is not None:
+                    error, self._error = self._error, None
+                    raise error
+
+    @contextmanager
+    def use(self, log_callback=None):
+        """사용하는 동안에는 내리지 않음"""
+        with self._lock:
+            self._users += 1
+        try:
+            yield self.get(log_callback)
+        finally:
+            with self._lock:
+                self._users -= 1
+                self._last_used = time.monotonic()
+
+    def unload(self):
+        with self._lock:
+            if self._users > 0 or self._generator is None:
+                return False
+            self._generator = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        print("💤 BioMistral model unloaded")
+        return True
+
+    # ----------------------------------------------------------
+    def _idle_loop(self):
+        while True:
+            time.sleep(self.check_interval)
+            with self._lock:
+                idle = (self._generator is not None and self._users == 0
+                        and time.monotonic() - self._last_used)
+            if not idle:
+                continue
+            free = self.available_memory()
+            if idle > self.idle_timeout or (free is not None and free < self.low_memory):
+                self.unload()
+
+
+_report_service = None
+_report_service_lock = threading.Lock()
+
+
+def get_report_service():
+    """프로세스 전체에서 공유하는 리포트 생성기 서비스"""
+    global _report_service
+    with _report_service_lock:
+        if _report_service is None:
+            _report_service = ReportGeneratorService()
+        return _report_service
@@ -1,36 +1,81 @@
+REPORT_SEED = 0  # 기본 생성 시드 (다시 생성할 때만 바꿈)
+
+
+def report_settings(shap_df, top_n=10, max_tokens=2048, temperature=0.7):
+    """리포트 내용에 영향을 주는 생성 설정 (시드 제외)"""
+    return {
+        "model": REPORT_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "temperature": temperature,
+        "top_n": min(top_n, len(shap_df)),
+        "max_tokens": max_tokens,
+    }
+
+
+def report_cache_key(shap_df, seed=REPORT_SEED, **settings):
+    """SHAP 표와 생성 설정에 대한 리포트 캐시 키 → (키, 설정)"""
+    params = dict(report_settings(shap_df, **settings), seed=seed)
+    return report_key(get_report_store(), shap_df, params), params
+
+
+def latest_report_key(shap_df, **settings):
+    """시드와 관계없이 '마지막으로 만든 리포트' 를 찾는 키"""
+    return report_key(get_report_store(), shap_df, report_settings(shap_df, **settings))
+
+
 class ReportGenWorker(QObject):
     finished = Signal(str)      
     error = Signal(str)         
     log = Signal(str)           
+    token_text = Signal(str)    # 생성되는 대로 전달되는 텍스트 조각
+    stats = Signal(str)         # time-to-first-token / tokens-per-second
 
-    def __init__(self, generator_instance, shap_df, feature_dict=None):
+    def __init__(self, shap_df, feature_dict=None, seed=REPORT_SEED):
         super().__init__()
-        self.generator = generator_instance
         self.shap_df = shap_df
         self.feature_dict = feature_dict
+        self.seed = seed
+        self.token = CancelToken()
 
     def run(self):
         try:
-            
-            if self.generator is None:
-                self.log.emit("🔄 Loading BioMistral model (First run takes time)...")
-                
-                self.generator = BioMistralReportGenerator()
-                self.log.emit("✅ Model loaded!")
-
-            # 2. 리포트 생성
-            self.log.emit("✍️ Generating report...")
-            report = self.generator.generate_report(
-                shap_df=self.shap_df,
-                feature_dictionary=self.feature_dict,
-                top_n=min(10, len(self.shap_df)),
-                max_tokens=2048,
-                temperature=0.7
-            )
-            
+            # 0. 같은 SHAP 값 / 설정으로 만든 리포트가 있으면 모델 없이 바로 반환
+            key, params = report_cache_key(self.shap_df, self.seed)
+            report = lookup_report(get_report_store(), key)
+            if report is not None:
+                self.log.emit("♻️ 저장된 리포트 사용")
+                self.finished.emit(report)
+                return
+
+            # 1. 공용 서비스에서 모델을 받음 (미리 올라와 있으면 바로, 로딩 중이면 기다림)
+            with get_report_service().use(log_callback=self.log.emit) as generator:
+                # 2. 리포트 생성 (모델 로딩 중 창을 닫았으면 여기서 멈춤)
+                self.token.check()
+                self.log.emit("✍️ Generating report...")
+                report = generator.generate_report(
+                    shap_df=self.shap_df,
+                    feature_dictionary=self.feature_dict,
+                    top_n=params["top_n"],
+                    max_tokens=params["max_tokens"],
+                    temperature=params["temperature"],
+                    log_callback=self.stats.emit,
+                    stream_callback=self.token_text.emit,
+                    cancel_token=self.token,
+                    seed=self.seed
+                )
+
+            self.token.check()
+            if report:
+                try:
+                    store = get_report_store()
+                    save_report(store, key, report, params)
+                    set_latest_report(store, latest_report_key(self.shap_df), key)
+                except OSError:
+                    traceback.print_exc()
             self.finished.emit(report)
 
+        except JobCancelled:
+            pass
         except Exception as e:
             self.error.emit(str(e))
-            import traceback
             traceback.print_exc()
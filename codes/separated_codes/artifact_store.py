@@ -0,0 +1,491 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+
+import pandas as pd
+
+from dicom_index import get_index
+from ras_converter import select_series, dicom_to_volume
+from seg_server import segment_volume
+from volume import Volume
+from radiomics_extr import extract_radiomics, FEATURE_COLS
+from testor import predict_with_model
+
+ARTIFACT_DIR = os.path.join(tempfile.gettempdir(), "Pyramid_RAS", "artifacts")
+REPORT_DIR = os.path.join(tempfile.gettempdir(), "Pyramid_RAS", "reports")
+
+# 단계 설정이 바뀌면 여기 값을 올려 이전 결과를 무효화
+CONVERT_PARAMS = {"orient": "RAS", "version": 1}
+SEGMENT_PARAMS = {"task": "total", "roi_subset": ["pancreas"], "version": 1}
+
+# 이보다 오래된 작업 폴더(*.tmp*) 는 중단된 실행이 남긴 것으로 보고 삭제
+TMP_MAX_AGE = 6 * 60 * 60
+
+
+def _hash_text(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=20).hexdigest()
+
+
+_file_digests = {}
+_file_digests_lock = threading.Lock()
+
+
+def file_digest(path):
+    """파일 내용 해시 (같은 세션에서는 크기/수정 시각이 같으면 재사용)"""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _file_digests_lock:
+        if memo_key in _file_digests:
+            return _file_digests[memo_key]
+
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    with _file_digests_lock:
+        _file_digests[memo_key] = digest
+    return digest
+
+
+def series_key(series_id, digests):
+    """SeriesInstanceUID + slice 파일 내용 해시 목록으로 만든 series 키"""
+    h = hashlib.blake2b(series_id.encode("utf-8"), digest_size=20)
+    for digest in digests:
+        h.update(digest.encode("ascii"))
+    return h.hexdigest()
+
+
+class ArtifactStore:
+    """
+    파이프라인 단계 결과(NIfTI, mask, feature, 예측)를 내용 해시 키로 저장
+
+    root/<stage>/<key>/ 에 결과 파일과 meta.json 을 두고, 전체 크기가
+    max_bytes 를 넘으면 가장 오래 안 쓴 항목부터 삭제
+    """
+
+    def __init__(self, root=ARTIFACT_DIR, max_bytes=20 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def stage_key(self, stage, parent_key, params):
+        """상위 단계 키 + 이 단계 설정으로 만든 키"""
+        payload = json.dumps(params, sort_keys=True, default=str)
+        return _hash_text(f"{stage}|{parent_key}|{payload}")
+
+    def _entry_dir(self, stage, key):
+        return os.path.join(self.root, stage, key)
+
+    def lookup(self, stage, key):
+        """저장된 결과의 주 파일 경로 (없으면 None)"""
+        entry = self._entry_dir(stage, key)
+        meta_path = os.path.join(entry, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(entry)  # LRU 기준 시각 갱신
+        except (OSError, ValueError):
+            return None
+
+        main = os.path.join(entry, meta["main"])
+        return main if os.path.exists(main) else None
+
+    def produce(self, stage, key, producer):
+        """
+        저장된 결과가 있으면 그 경로를, 없으면 producer(작업 폴더) 를 실행해 저장
+
+        producer 는 작업 폴더 안에 결과를 쓰고 주 파일 경로를 반환해야 함.
+        예외가 나면 아무것도 저장하지 않음
+
+        Returns:
+            (주 파일 경로, 캐시 적중 여부)
+        """
+        hit = self.lookup(stage, key)
+        if hit is not None:
+            return hit, True
+
+        stage_dir = os.path.join(self.root, stage)
+        os.makedirs(stage_dir, exist_ok=True)
+        work = tempfile.mkdtemp(prefix=f"{key}.tmp", dir=stage_dir)
+
+        try:
+            main = os.path.relpath(producer(work), work)
+            with open(os.path.join(work, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"main": main, "created": time.time()}, f)
+        except Exception:
+            shutil.rmtree(work, ignore_errors=True)
+            raise
+
+        entry = self._entry_dir(stage, key)
+        try:
+            os.replace(work, entry)
+        except OSError:
+            # 다른 실행이 먼저 같은 결과를 저장한 경우 그 결과를 사용
+            winner = self.lookup(stage, key)
+            if winner is not None:
+                shutil.rmtree(work, ignore_errors=True)
+                return winner, False
+            # 먼저 저장된 항목이 이미 정리됐거나 깨졌으면 작업 폴더의 결과를 그대로 반환
+            # (작업 폴더는 TMP_MAX_AGE 가 지나면 _evict 가 정리)
+            return os.path.join(work, main), False
+
+        self._evict(keep=entry)
+        return os.path.join(entry, main), False
+
+    def discard(self, stage, key):
+        """항목 삭제 (읽기 직전에 파일이 사라진 경우 등)"""
+        with self._lock:
+            self._remove(self._entry_dir(stage, key))
+
+    @staticmethod
+    def _dir_size(path):
+        return sum(
+            os.path.getsize(os.path.join(dp, f))
+            for dp, _, files in os.walk(path) for f in files
+        )
+
+    def _remove(self, entry):
+        """
+        meta.json 을 먼저 지워 조회되지 않게 한 뒤 삭제하고, 실제로 비운 크기를 반환
+
+        뷰어가 memory-map 으로 연 파일처럼 지워지지 않는 파일은 남고
+        meta.json 이 없는 항목은 다음 정리 때 가장 먼저 다시 시도함
+        """
+        before = self._dir_size(entry)
+        try:
+            os.remove(os.path.join(entry, "meta.json"))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return 0  # meta.json 을 못 지우면 항목을 그대로 둠
+        shutil.rmtree(entry, ignore_errors=True)
+        return before - (self._dir_size(entry) if os.path.exists(entry) else 0)
+
+    def _evict(self, keep=None):
+        """크기 제한을 넘으면 오래 안 쓴 항목부터 삭제 (keep 은 방금 저장한 항목)"""
+        now = time.time()
+        with self._lock:
+            entries = []
+            total = 0
+            for stage in os.listdir(self.root):
+                stage_dir = os.path.join(self.root, stage)
+                if not os.path.isdir(stage_dir):
+                    continue
+                for key in os.listdir(stage_dir):
+                    entry = os.path.join(stage_dir, key)
+                    if ".tmp" in key:
+                        # 변환 도중 종료되어 남은 작업 폴더 / 임시 파일
+                        try:
+                            stale = now - os.path.getmtime(entry) > TMP_MAX_AGE
+                        except OSError:
+                            continue
+                        if stale:
+                            if os.path.isdir(entry):
+                                shutil.rmtree(entry, ignore_errors=True)
+                            else:
+                                try:
+                                    os.remove(entry)
+                                except OSError:
+                                    pass
+                        continue
+                    if not os.path.isdir(entry):
+                        continue
+                    try:
+                        size = self._dir_size(entry)
+                        # meta.json 이 없는 (지우다 만) 항목은 가장 먼저 정리
+                        broken = not os.path.exists(os.path.join(entry, "meta.json"))
+                        entries.append((not broken, os.path.getmtime(entry), size, entry))
+                    except OSError:
+                        continue
+                    total += size
+
+            entries.sort()
+            for _, _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                if entry == keep:
+                    continue
+                total -= self._remove(entry)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store(root=ARTIFACT_DIR):
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore(root)
+        return _store
+
+
+_report_store = None
+
+
+def get_report_store(root=REPORT_DIR):
+    """생성된 리포트 저장소 (단계 결과와 따로 두고 크기도 따로 제한)"""
+    global _report_store
+    with _store_lock:
+        if _report_store is None:
+            _report_store = ArtifactStore(root, max_bytes=64 * 1024 ** 2)
+        return _report_store
+
+
+# =========================================================
+#   단계별 캐시 래퍼 (AnalysisWorker / batch_runner 공용)
+# =========================================================
+def _log_hit(hit, stage, log_callback):
+    if hit and log_callback:
+        log_callback(f"♻️ 저장된 {stage} 결과 사용")
+
+
+def _produce(store, stage, key, producer, load):
+    """
+    store.produce 후 결과 객체까지 반환 → (경로, 적중 여부, 결과)
+
+    producer(작업 폴더) 는 (결과, 주 파일 경로) 를 반환. 새로 만든 경우는 메모리의
+    결과를 그대로 쓰고, 적중한 경우는 load(경로) 로 읽음. 조회와 읽기 사이에 다른
+    스레드의 정리로 파일이 사라졌으면 (FileNotFoundError) 한 번 더 만듦
+    """
+    for retry in (False, True):
+        produced = {}
+
+        def run(out):
+            produced["value"], main = producer(out)
+            return main
+
+        path, hit = store.produce(stage, key, run)
+        if not hit:
+            return path, False, produced["value"]
+        try:
+            return path, True, load(path)
+        except FileNotFoundError:
+            if retry:
+                raise
+            store.discard(stage, key)
+
+
+def cached_convert(store, dicom_folder, log_callback=None):
+    """
+    Returns: (nifti 키, CT Volume)
+
+    store 가 None 이면 디스크에 쓰지 않고 메모리 Volume 만 반환
+    """
+    # 파일 해시는 header 인덱스에 함께 저장되므로 다시 열 때는 읽지 않음
+    index = get_index(dicom_folder)
+    series_id, files = select_series(dicom_folder, index)
+    if store is None:
+        return None, dicom_to_volume(dicom_folder, files=files)
+
+    key = store.stage_key("nifti", series_key(series_id, index.digests(files)), CONVERT_PARAMS)
+
+    def producer(out):
+        # 비압축 .nii 로 저장 (다시 읽을 때 gzip 해제 비용 없음)
+        volume = dicom_to_volume(dicom_folder, files=files)
+        return volume, volume.save(os.path.join(out, "ct.nii"))
+
+    # 저장된 사본은 비압축이라 memory-map 으로 열어 필요한 부분만 읽음
+    path, hit, volume = _produce(store, "nifti", key, producer,
+                                 lambda p: Volume.from_file(p, mmap=True))
+    _log_hit(hit, "NIfTI", log_callback)
+    volume.path = path
+    return key, volume
+
+
+class _NoMask(Exception):
+    """segmentation 은 끝났지만 췌장이 없음 (저장하지 않음)"""
+
+
+def cached_segment(store, nifti_key, volume, log_callback=None):
+    """
+    Returns: (mask 키, mask Volume) - 췌장을 찾지 못하면 mask 는 None.
+    서버 시작 실패 / TotalSegmentator 오류는 SegmentationError 로 그대로 올림
+    """
+    if store is None:
+        return None, segment_volume(volume)
+
+    key = store.stage_key("mask", nifti_key, SEGMENT_PARAMS)
+
+    def producer(out):
+        mask = segment_volume(volume)
+        if mask is None:
+            raise _NoMask()
+        return mask, mask.save(os.path.join(out, "pancreas.nii.gz"))
+
+    try:
+        path, hit, mask = _produce(store, "mask", key, producer, Volume.from_file)
+    except _NoMask:
+        return key, None
+    _log_hit(hit, "segmentation", log_callback)
+    mask.path = path
+    return key, mask
+
+
+def cached_extract(store, mask_key, volume, mask, yaml_path, log_callback=None, **kwargs):
+    """
+    Returns: (feature 키, 한 줄 feature DataFrame)
+
+    volume / mask 는 Volume 또는 NIfTI 경로
+    """
+    if store is None:
+        return None, extract_radiomics(volume, mask, yaml_path, **kwargs)
+
+    with open(yaml_path, "rb") as f:
+        yaml_digest = hashlib.blake2b(f.read(), digest_size=20).hexdigest()
+    params = {
+        "yaml": yaml_digest,
+        "features": FEATURE_COLS,
+        # 결과 값에 영향을 주는 옵션만 키에 포함 (n_workers, cache 는 값이 같음)
+        "planned": kwargs.get("planned", True),
+        "crop": kwargs.get("crop", False),
+    }
+    key = store.stage_key("features", mask_key, params)
+
+    def producer(out):
+        df = extract_radiomics(volume, mask, yaml_path, **kwargs)
+        path = os.path.join(out, "features.csv")
+        df.to_csv(path, index=False)
+        return df, path
+
+    _, hit, df = _produce(store, "features", key, producer, pd.read_csv)
+    _log_hit(hit, "radiomics", log_callback)
+    return key, df
+
+
+def cached_predict(store, feature_key, radiomics, name, model_path, scaler_path,
+                   threshold=0.5, log_callback=None, top_k=10):
+    """Returns: (예측 결과 df, SHAP 상위 feature df) - predict_with_model 과 동일"""
+    if store is None:
+        return predict_with_model(radiomics, name, model_path, scaler_path,
+                                  threshold=threshold, log_callback=log_callback, top_k=top_k)
+
+    params = {
+        "model": file_digest(model_path),
+        "scaler": file_digest(scaler_path),
+        "threshold": threshold,
+        "top_k": top_k,
+    }
+    key = store.stage_key("prediction", feature_key, params)
+
+    path = store.lookup("prediction", key)
+    saved = None
+    if path is not None:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            top_features_df = pd.read_csv(os.path.join(os.path.dirname(path), "top_features.csv"))
+        except FileNotFoundError:
+            # 조회한 뒤 다른 스레드의 정리로 지워진 경우 다시 예측
+            saved = None
+            store.discard("prediction", key)
+    if saved is not None:
+        result_df = radiomics.copy()
+        result_df["Probability"] = [saved["Probability"]]
+        result_df["Prediction"] = [saved["Prediction"]]
+
+        if log_callback:
+            _log_hit(True, "예측", log_callback)
+            log_callback(f"환자 {name}의 비정상 예측 결과는 "
+                         f"{saved['Probability']*100:.2f}% 확률로 {saved['Prediction']}입니다.")
+        return result_df, top_features_df
+
+    result_df, top_features_df = predict_with_model(
+        radiomics, name, model_path, scaler_path,
+        threshold=threshold, log_callback=log_callback, top_k=top_k
+    )
+    if result_df is None or top_features_df is None:
+        return result_df, top_features_df
+
+    def producer(out):
+        top_features_df.to_csv(os.path.join(out, "top_features.csv"), index=False)
+        path = os.path.join(out, "prediction.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "Probability": float(result_df["Probability"].iloc[0]),
+                "Prediction": result_df["Prediction"].iloc[0],
+            }, f, ensure_ascii=False)
+        return path
+
+    store.produce("prediction", key, producer)
+    return result_df, top_features_df
+
+
+# =========================================================
+#   리포트 캐시 (ShapGraphDialog / ReportGenWorker)
+# =========================================================
+def report_key(store, shap_df, params, decimals=4):
+    """
+    SHAP 표 + 생성 설정으로 만든 리포트 키
+
+    프롬프트에 들어가는 자릿수로 반올림하고 feature 이름순으로 정렬해서,
+    표시 순서나 미세한 부동소수 차이로 키가 달라지지 않게 함
+    """
+    table = sorted(
+        (str(f), round(float(v), decimals) + 0.0)  # -0.0 → 0.0
+        for f, v in zip(shap_df["feature"], shap_df["shap_value"])
+    )
+    return store.stage_key("report", _hash_text(json.dumps(table)), params)
+
+
+def lookup_report(store, key):
+    """저장된 리포트 본문 (없으면 None)"""
+    path = store.lookup("report", key)
+    if path is None:
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _latest_path(store, latest_key):
+    return os.path.join(store.root, "report-latest", f"{latest_key}.json")
+
+
+def set_latest_report(store, latest_key, key):
+    """
+    같은 SHAP 표 / 설정(시드 제외)에서 마지막으로 만든 리포트 키를 기록
+
+    포인터는 작은 파일이라 크기 제한 정리 대상이 아니고, 가리키는 리포트가
+    정리되면 latest_report 가 None 을 반환
+    """
+    path = _latest_path(store, latest_key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "updated": time.time()}, f)
+    os.replace(tmp, path)
+
+
+def latest_report(store, latest_key):
+    """마지막으로 만든 리포트 본문 (없으면 None)"""
+    try:
+        with open(_latest_path(store, latest_key), "r", encoding="utf-8") as f:
+            key = json.load(f)["key"]
+    except (OSError, ValueError, KeyError):
+        return None
+    return lookup_report(store, key)
+
+
+def save_report(store, key, report, params):
+    def producer(out):
+        with open(os.path.join(out, "params.json"), "w", encoding="utf-8") as f:
+            json.dump(params, f, ensure_ascii=False, default=str)
+        path = os.path.join(out, "report.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(report)
+        return path
+
+    store.produce("report", key, producer)
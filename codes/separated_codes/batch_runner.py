@@ -0,0 +1,279 @@
+import os
+import sys
+import csv
+import time
+import argparse
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from dicom_index import get_index, set_index_persistence
+from patient_information_collection import collect_patient_information
+from radiomics_extr import FEATURE_COLS
+from testor import predict_cohort, get_inference_session
+from artifact_store import ArtifactStore, cached_convert, cached_segment, cached_extract
+
+ASSETS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "assets"))
+
+STAGES = ("convert", "segment", "extract")
+RESULT_COLS = ["Study", "PatientName", "Error"] + [f"{s}_s" for s in STAGES] + FEATURE_COLS
+
+
+def find_studies(root):
+    """root 바로 아래 폴더를 study 로 취급 (하위 폴더가 없으면 root 자체가 study)"""
+    if not os.path.isdir(root):
+        raise ValueError(f"경로가 폴더가 아닙니다: {root}")
+
+    studies = sorted(
+        os.path.join(root, d) for d in os.listdir(root)
+        if os.path.isdir(os.path.join(root, d))
+    )
+    return studies or [root]
+
+
+def result_row(rec):
+    """study 기록 → 결과 표 한 줄 (feature 가 없으면 빈 값)"""
+    row = {"Study": rec["Study"], "PatientName": rec["PatientName"], "Error": rec["Error"]}
+    for name in STAGES:
+        row[f"{name}_s"] = rec.get(f"{name}_s")
+    if rec.get("features") is not None:
+        row.update(rec["features"].iloc[0].to_dict())
+    return row
+
+
+class PartialResults:
+    """
+    study 가 끝날 때마다 (feature 또는 오류) 한 줄씩 CSV 에 바로 추가
+
+    밤새 돌리는 배치가 중간에 죽거나 예측 단계에서 실패해도 추출한 feature 는 남음
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(RESULT_COLS)
+
+    def append(self, rec):
+        row = result_row(rec)
+        with self._lock, open(self.path, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow([row.get(c) for c in RESULT_COLS])
+
+
+class BatchPipeline:
+    """
+    study 별 변환 → segmentation → radiomics 추출을 단계별 스레드 풀로 겹쳐 실행
+
+    각 단계는 자기 풀의 동시 실행 수만큼만 돌고, 끝난 study 는 다음 단계 풀로
+    넘어가므로 study N+1 변환, N segmentation, N-1 추출이 동시에 진행됨.
+    변환이 segmentation 보다 너무 앞서 나가지 않도록 max_ahead 로 제한
+
+    단계 사이에는 Volume 을 메모리로 넘기고, store 가 있을 때만 결과를 저장.
+    work_dir 를 주면 study 별 mask 를 남기고, results (PartialResults) 를 주면
+    study 가 끝나는 대로 결과 줄을 기록
+    """
+
+    def __init__(self, work_dir, yaml_path, convert_workers=2, segment_workers=1,
+                 extract_workers=2, extract_processes=1, crop=True, max_ahead=None,
+                 store=None, results=None, log_callback=print):
+        self.work_dir = work_dir
+        self.store = store
+        self.results = results
+        self.yaml_path = yaml_path
+        self.extract_processes = extract_processes
+        self.crop = crop
+        self.log = log_callback
+
+        self.pools = {
+            "convert": ThreadPoolExecutor(convert_workers, thread_name_prefix="convert"),
+            "segment": ThreadPoolExecutor(segment_workers, thread_name_prefix="segment"),
+            "extract": ThreadPoolExecutor(extract_workers, thread_name_prefix="extract"),
+        }
+        self._ahead = threading.BoundedSemaphore(max_ahead or segment_workers + 2)
+
+        self.records = []
+        self._pending = 0
+        self._cond = threading.Condition()
+
+    # ----------------------------------------------------------
+    def run(self, studies):
+        for i, study in enumerate(studies):
+            # 같은 폴더 이름끼리 충돌하지 않도록 순번을 붙인 작업 폴더
+            base_name = os.path.basename(study.rstrip("/\\"))
+            study_dir = os.path.join(self.work_dir or "", f"{i:05d}_{base_name}")
+            rec = {"Study": study, "PatientName": None, "Error": None, "_dir": study_dir}
+            self.records.append(rec)
+
+            with self._cond:
+                self._pending += 1
+            # 변환 단계가 segmentation 대기열을 무한히 쌓지 않도록 대기
+            self._ahead.acquire()
+            self.pools["convert"].submit(self._stage, "convert", rec)
+
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending == 0)
+
+        for pool in self.pools.values():
+            pool.shutdown()
+        return self.records
+
+    def _stage(self, name, rec):
+        if name == "segment":
+            # segmentation 이 시작되면 다음 study 변환을 허용
+            self._ahead.release()
+
+        start = time.perf_counter()
+        try:
+            getattr(self, f"_{name}")(rec)
+        except Exception as e:
+            rec["Error"] = f"{name}: {e}"
+            self.log(f"❌ {rec['Study']} [{name}] {e}")
+            traceback.print_exc()
+            rec.pop("_ct", None)
+            rec.pop("_mask", None)
+        finally:
+            rec[f"{name}_s"] = round(time.perf_counter() - start, 2)
+
+        if name == "convert" and rec["Error"] is not None:
+            self._ahead.release()
+
+        nxt = {"convert": "segment", "segment": "extract"}.get(name)
+        if rec["Error"] is None and nxt is not None:
+            self.pools[nxt].submit(self._stage, nxt, rec)
+            return
+
+        if self.results is not None:
+            try:
+                self.results.append(rec)
+            except Exception as e:
+                self.log(f"❌ {rec['Study']} 결과 기록 실패: {e}")
+                traceback.print_exc()
+
+        with self._cond:
+            self._pending -= 1
+            self._cond.notify_all()
+
+    # ----------------------------------------------------------
+    def _convert(self, rec):
+        index = get_index(rec["Study"], refresh=True)
+        rec["PatientName"] = collect_patient_information(rec["Study"], index)
+        rec["nifti_key"], rec["_ct"] = cached_convert(self.store, rec["Study"])
+        self.log(f"[변환] {rec['Study']}")
+
+    def _segment(self, rec):
+        rec["mask_key"], mask = cached_segment(self.store, rec["nifti_key"], rec["_ct"])
+        if mask is None:
+            raise RuntimeError("췌장 mask 가 생성되지 않았습니다.")
+        if self.work_dir:
+            os.makedirs(rec["_dir"], exist_ok=True)
+            mask.save(os.path.join(rec["_dir"], "pancreas.nii.gz"))
+        rec["mask_path"] = mask.path
+        rec["_mask"] = mask
+        self.log(f"[segmentation] {rec['Study']}")
+
+    def _extract(self, rec):
+        kwargs = {"n_workers": self.extract_processes, "crop": self.crop}
+        try:
+            _, rec["features"] = cached_extract(self.store, rec["mask_key"], rec["_ct"],
+                                                rec["_mask"], self.yaml_path, **kwargs)
+        finally:
+            # 다음 study 를 위해 영상 메모리를 바로 반환
+            rec.pop("_ct", None)
+            rec.pop("_mask", None)
+        self.log(f"[추출] {rec['Study']}")
+
+
+def build_results_table(partial_path, model_path, scaler_path, threshold=0.5, batch_size=256,
+                        log_callback=print):
+    """중간 결과 파일을 읽어 추출이 끝난 study 를 micro-batch 로 예측하고 결과 표를 만듦"""
+    table = pd.read_csv(partial_path, encoding="utf-8", dtype={"Study": str, "PatientName": str})
+    # 끝난 순서로 기록되므로 study 순서로 되돌림
+    table = table.sort_values("Study", kind="stable").reset_index(drop=True)
+
+    done = table[table["Error"].isna()]
+    if len(done):
+        preds = predict_cohort(done.set_index("Study")[FEATURE_COLS], model_path, scaler_path,
+                               threshold=threshold, batch_size=batch_size,
+                               log_callback=log_callback)
+        table = table.merge(preds.rename(columns={"PatientID": "Study"}), on="Study", how="left")
+    else:
+        table["Probability"] = None
+        table["Prediction"] = None
+
+    front = ["Study", "PatientName", "Probability", "Prediction", "Error"]
+    return table[front + [c for c in table.columns if c not in front]]
+
+
+def write_table(table, output):
+    if output.lower().endswith(".parquet"):
+        table.to_parquet(output, index=False)
+    else:
+        table.to_csv(output, index=False, encoding="utf-8-sig")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pyramid headless batch analysis")
+    parser.add_argument("root", help="study 폴더들이 들어 있는 상위 폴더")
+    parser.add_argument("-o", "--output", default="pyramid_results.csv",
+                        help="결과 표 (.csv 또는 .parquet)")
+    parser.add_argument("--work-dir", default=None,
+                        help="지정하면 study 별 췌장 mask 를 저장")
+    parser.add_argument("--params", default=os.path.join(ASSETS_DIR, "parameters.yaml"))
+    parser.add_argument("--model", default=os.path.join(ASSETS_DIR, "final_model.pt"))
+    parser.add_argument("--scaler", default=os.path.join(ASSETS_DIR, "scaler.pkl"))
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--convert-workers", type=int, default=2)
+    parser.add_argument("--segment-workers", type=int, default=1)
+    parser.add_argument("--extract-workers", type=int, default=2)
+    parser.add_argument("--extract-processes", type=int, default=1,
+                        help="study 하나의 radiomics 추출에 쓰는 프로세스 수")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--no-crop", action="store_true",
+                        help="ROI crop 없이 전체 영상에서 필터 계산")
+    parser.add_argument("--cache-dir", default=None,
+                        help="단계별 결과 저장소 (이미 처리한 study 는 건너뜀)")
+    parser.add_argument("--cache-size-gb", type=float, default=100.0)
+    parser.add_argument("--persist-index", action="store_true",
+                        help="DICOM header 인덱스를 study 폴더에 저장해 다음 실행에서 재사용 "
+                             "(환자 이름/ID 는 저장하지 않음)")
+    args = parser.parse_args(argv)
+    set_index_persistence(args.persist_index)
+
+    # 모델/스케일러 경로가 잘못됐으면 몇 시간 추출한 뒤가 아니라 지금 실패
+    get_inference_session(args.model, args.scaler)
+
+    studies = find_studies(args.root)
+    partial_path = os.path.splitext(args.output)[0] + ".partial.csv"
+    results = PartialResults(partial_path)
+    print(f"=== {len(studies)}개 study 배치 분석 시작 (중간 결과: {partial_path}) ===")
+
+    pipeline = BatchPipeline(
+        args.work_dir, args.params,
+        convert_workers=args.convert_workers,
+        segment_workers=args.segment_workers,
+        extract_workers=args.extract_workers,
+        extract_processes=args.extract_processes,
+        crop=not args.no_crop,
+        store=(ArtifactStore(args.cache_dir, int(args.cache_size_gb * 1024 ** 3))
+               if args.cache_dir else None),
+        results=results,
+    )
+    pipeline.run(studies)
+
+    # 예측은 기록된 중간 결과에 대한 마지막 단계 (실패하면 중간 결과 파일은 그대로 남음)
+    table = build_results_table(partial_path, args.model, args.scaler,
+                                threshold=args.threshold, batch_size=args.batch_size)
+    write_table(table, args.output)
+    os.remove(partial_path)
+
+    n_failed = int(table["Error"].notna().sum())
+    print(f"=== 완료: {len(table) - n_failed}개 성공, {n_failed}개 실패 → {args.output} ===")
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pydicom
+
+INDEX_FILE = ".pyramid_index.json"
+INDEX_VERSION = 2
+
+# 인덱스를 DICOM 폴더에 저장할지 (기본은 메모리에만 유지). set_index_persistence 로 변경
+PERSIST_INDEX = False
+
+# 환자 식별 정보 - 메모리에서만 쓰고 인덱스 파일에는 남기지 않음
+_PHI_TAGS = ("PatientName", "PatientID")
+
+_HEADER_TAGS = [
+    "PatientName", "PatientID", "StudyInstanceUID", "SeriesInstanceUID",
+    "SeriesDescription", "Modality", "InstanceNumber",
+    "ImagePositionPatient", "ImageOrientationPatient",
+]
+
+
+def _scan_files(root):
+    """root 아래 파일의 (상대 경로, 크기, 수정 시각). scandir 의 stat 을 재사용"""
+    found = []
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = list(os.scandir(current))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file() and entry.name != INDEX_FILE:
+                st = entry.stat()
+                found.append((os.path.relpath(entry.path, root), st.st_size, st.st_mtime_ns))
+    return found
+
+
+def _read_header(path):
+    try:
+        ds = pydicom.dcmread(path, stop_before_pixels=True, specific_tags=_HEADER_TAGS)
+    except Exception:
+        return None  # DICOM 이 아닌 파일
+    if "SeriesInstanceUID" not in ds:
+        return None
+
+    def floats(name):
+        value = getattr(ds, name, None)
+        return [float(v) for v in value] if value is not None else None
+
+    instance = getattr(ds, "InstanceNumber", None)
+    return {
+        "PatientName": str(getattr(ds, "PatientName", "Unknown")),
+        "PatientID": str(getattr(ds, "PatientID", "")),
+        "StudyInstanceUID": str(getattr(ds, "StudyInstanceUID", "")),
+        "SeriesInstanceUID": str(ds.SeriesInstanceUID),
+        "SeriesDescription": str(getattr(ds, "SeriesDescription", "")),
+        "Modality": str(getattr(ds, "Modality", "")),
+        "InstanceNumber": int(instance) if instance not in (None, "") else None,
+        "ImagePositionPatient": floats("ImagePositionPatient"),
+        "ImageOrientationPatient": floats("ImageOrientationPatient"),
+    }
+
+
+def _slice_position(header):
+    # GDCM 과 같이 slice 법선 방향으로 IPP 를 투영한 거리로 정렬
+    ipp = header.get("ImagePositionPatient")
+    iop = header.get("ImageOrientationPatient")
+    if ipp is None or iop is None:
+        return None
+    r, c = iop[:3], iop[3:]
+    normal = (r[1] * c[2] - r[2] * c[1], r[2] * c[0] - r[0] * c[2], r[0] * c[1] - r[1] * c[0])
+    return sum(p * n for p, n in zip(ipp, normal))
+
+
+class DicomIndex:
+    """
+    폴더의 DICOM header 를 한 번만 읽어 patient / study / series 인덱스로 보관
+
+    entries: 상대 경로 → {"size", "mtime", "header"(DICOM 이 아니면 None), "digest"}
+    persist=True 면 폴더 안 INDEX_FILE 에 저장하고, 크기와 수정 시각이 같은 파일은
+    저장된 인덱스를 재사용. 저장본에는 환자 이름/ID 를 넣지 않음
+    """
+
+    def __init__(self, root, entries, persist=False):
+        self.root = os.path.abspath(root)
+        self.entries = entries
+        self.persist = persist
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------
+    @classmethod
+    def build(cls, root, workers=16, persist=False, previous=None):
+        if not os.path.isdir(root):
+            raise ValueError(f"경로가 폴더가 아닙니다: {root}")
+
+        if previous is not None:
+            old = previous.entries
+        else:
+            old = cls._load_entries(root) if persist else {}
+
+        entries = {}
+        to_read = []
+        for rel, size, mtime in _scan_files(root):
+            cached = old.get(rel)
+            if cached is not None and cached["size"] == size and cached["mtime"] == mtime:
+                entries[rel] = cached
+            else:
+                entries[rel] = {"size": size, "mtime": mtime, "header": None}
+                to_read.append(rel)
+
+        if to_read:
+            with ThreadPoolExecutor(workers) as pool:
+                headers = pool.map(_read_header, (os.path.join(root, r) for r in to_read))
+                for rel, header in zip(to_read, headers):
+                    entries[rel]["header"] = header
+
+        index = cls(root, entries, persist)
+        if persist and (to_read or len(entries) != len(old)):
+            index.save()
+        return index
+
+    @classmethod
+    def _load_entries(cls, root):
+        try:
+            with open(os.path.join(root, INDEX_FILE), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != INDEX_VERSION:
+            return {}
+        return data["entries"]
+
+    def save(self):
+        """폴더 안에 인덱스 저장 (쓸 수 없는 폴더면 저장하지 않고 None)"""
+        with self._lock:
+            entries = {}
+            for rel, entry in self.entries.items():
+                header = entry["header"]
+                if header is not None:
+                    header = {k: v for k, v in header.items() if k not in _PHI_TAGS}
+                entries[rel] = dict(entry, header=header)
+            payload = json.dumps({"version": INDEX_VERSION, "entries": entries})
+
+        path = os.path.join(self.root, INDEX_FILE)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            return None
+        return path
+
+    # ----------------------------------------------------------
+    def series(self):
+        """SeriesInstanceUID → 상대 경로 목록"""
+        grouped = {}
+        for rel, entry in self.entries.items():
+            header = entry["header"]
+            if header is not None:
+                grouped.setdefault(header["SeriesInstanceUID"], []).append(rel)
+        return grouped
+
+    def studies(self):
+        """StudyInstanceUID → SeriesInstanceUID 목록"""
+        grouped = {}
+        for uid, rels in self.series().items():
+            study = self.entries[rels[0]]["header"]["StudyInstanceUID"]
+            grouped.setdefault(study, []).append(uid)
+        return grouped
+
+    def series_files(self, series_uid):
+        """slice 위치 순서로 정렬된 절대 경로 목록"""
+        rels = self.series()[series_uid]
+
+        def order(rel):
+            header = self.entries[rel]["header"]
+            pos = _slice_position(header)
+            inst = header.get("InstanceNumber")
+            return (pos is None, pos or 0.0, inst if inst is not None else 0, rel)
+
+        return [os.path.join(self.root, rel) for rel in sorted(rels, key=order)]
+
+    def largest_series(self):
+        """파일 수가 가장 많은 series 의 (SeriesInstanceUID, 정렬된 파일 목록)"""
+        grouped = self.series()
+        if not grouped:
+            raise FileNotFoundError("DICOM 파일을 찾을 수 없습니다.")
+        uid = max(grouped, key=lambda s: len(grouped[s]))
+        return uid, self.series_files(uid)
+
+    def patient_name(self):
+        _, files = self.largest_series()
+        rel = os.path.relpath(files[0], self.root)
+        header = self.entries[rel]["header"]
+        if "PatientName" not in header:
+            # 저장된 인덱스에서 읽은 header 에는 환자 정보가 없으므로 파일에서 다시 읽음
+            fresh = _read_header(files[0]) or {}
+            with self._lock:
+                for tag in _PHI_TAGS:
+                    header[tag] = fresh.get(tag, "Unknown" if tag == "PatientName" else "")
+        return header["PatientName"]
+
+    def digests(self, paths, workers=8):
+        """파일 내용 해시 (인덱스에 저장해 두고 크기/수정 시각이 같으면 재사용)"""
+        rels = [os.path.relpath(p, self.root) for p in paths]
+        missing = [r for r in rels if not self.entries[r].get("digest")]
+
+        def digest(rel):
+            h = hashlib.blake2b(digest_size=20)
+            with open(os.path.join(self.root, rel), "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            return h.hexdigest()
+
+        if missing:
+            with ThreadPoolExecutor(workers) as pool:
+                for rel, value in zip(missing, pool.map(digest, missing)):
+                    with self._lock:
+                        self.entries[rel]["digest"] = value
+            if self.persist:
+                self.save()
+
+        return [self.entries[r]["digest"] for r in rels]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def set_index_persistence(enabled):
+    """인덱스를 DICOM 폴더에 저장할지 설정 (환자 이름/ID 는 저장하지 않음)"""
+    global PERSIST_INDEX
+    PERSIST_INDEX = bool(enabled)
+
+
+def get_index(root, refresh=False):
+    """
+    프로세스 전체에서 공유하는 폴더 인덱스
+
+    refresh=True 면 파일 목록/수정 시각을 다시 확인해 바뀐 파일만 새로 읽음
+    """
+    key = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(key)
+    if index is not None and not refresh:
+        return index
+
+    index = DicomIndex.build(root, persist=PERSIST_INDEX, previous=index)
+    with _indexes_lock:
+        _indexes[key] = index
+    return index
@@ -0,0 +1,184 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import SimpleITK as sitk
+
+# GUI 워커가 같이 쓰는 디스크 캐시 위치 (프로세스 풀 워커도 이 경로를 공유)
+FILTER_CACHE_DIR = os.path.join(tempfile.gettempdir(), "Pyramid_RAS", "filter_cache")
+
+
+def image_digest(img):
+    """영상 내용(voxel + geometry) 해시"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((img.GetSize(), img.GetSpacing(), img.GetOrigin(),
+                   img.GetDirection(), img.GetPixelIDValue())).encode())
+    h.update(memoryview(sitk.GetArrayViewFromImage(img)).cast("B"))
+    return h.hexdigest()
+
+
+def filter_key(digest, type_name, args):
+    """영상 해시 + 필터 결과 이름 + 필터 설정으로 만든 캐시 키"""
+    payload = json.dumps(args, sort_keys=True, default=str)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{digest}|{type_name}|{payload}".encode())
+    return h.hexdigest()
+
+
+def _image_nbytes(img):
+    return (img.GetNumberOfPixels() * img.GetNumberOfComponentsPerPixel()
+            * img.GetSizeOfPixelComponent())
+
+
+class FilteredImageCache:
+    """
+    마스크와 무관한 필터 영상(wavelet/LoG/square ...) 캐시
+
+    메모리는 max_bytes 안에서 LRU 로 유지하고, cache_dir 이 있으면 비압축
+    .mha 로 디스크에도 저장 (max_disk_bytes 초과 시 오래된 것부터 삭제)
+    """
+
+    def __init__(self, max_bytes=2 * 1024 ** 3, cache_dir=None,
+                 max_disk_bytes=8 * 1024 ** 3):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._entries = OrderedDict()  # key -> (image, kwargs, nbytes)
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # ----------------------------------------------------------
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0], entry[1]
+
+        loaded = self._load_from_disk(key)
+        if loaded is None:
+            return None
+        self._put_memory(key, *loaded)
+        return loaded
+
+    def put(self, key, image, kwargs):
+        self._put_memory(key, image, kwargs)
+        if self.cache_dir:
+            self._save_to_disk(key, image, kwargs)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    # ----------------------------------------------------------
+    def _put_memory(self, key, image, kwargs):
+        if self.max_bytes <= 0:
+            return
+        nbytes = _image_nbytes(image)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._nbytes -= old[2]
+            self._entries[key] = (image, kwargs, nbytes)
+            self._nbytes += nbytes
+
+            while self._nbytes > self.max_bytes:
+                _, (_, _, size) = self._entries.popitem(last=False)
+                self._nbytes -= size
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".mha", base + ".json"
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+
+        img_path, meta_path = self._paths(key)
+        if not (os.path.exists(img_path) and os.path.exists(meta_path)):
+            return None
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                kwargs = json.load(f)
+            image = sitk.ReadImage(img_path)
+            os.utime(img_path)
+            return image, kwargs
+        except Exception:
+            # 다른 프로세스가 쓰는 중이거나 깨진 파일이면 캐시 miss 로 처리
+            return None
+
+    def _save_to_disk(self, key, image, kwargs):
+        img_path, meta_path = self._paths(key)
+        tmp_img = f"{img_path}.{os.getpid()}.tmp.mha"
+        tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+
+        try:
+            sitk.WriteImage(image, tmp_img)
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(kwargs, f, default=str)
+            # json 먼저 옮겨서 영상이 보이는 시점에는 항상 설정이 있도록 함
+            os.replace(tmp_meta, meta_path)
+            os.replace(tmp_img, img_path)
+        except Exception as e:
+            print(f"Filter cache write error: {e}")
+            for p in (tmp_img, tmp_meta):
+                if os.path.exists(p):
+                    os.unlink(p)
+            return
+
+        self._evict_disk()
+
+    def _evict_disk(self):
+        files = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".mha") or ".tmp" in name:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.unlink(path)
+                os.unlink(path[:-len(".mha")] + ".json")
+            except OSError:
+                pass
+            total -= size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_filter_cache(cache_dir=FILTER_CACHE_DIR, max_bytes=0):
+    """
+    프로세스 전체에서 공유하는 필터 캐시 (분석/재예측 워커가 같이 사용)
+
+    GUI 추출은 프로세스 풀에서 돌고 풀 워커는 디스크 계층만 보므로 기본은
+    메모리 계층 없이 디스크만 사용
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FilteredImageCache(max_bytes=max_bytes, cache_dir=cache_dir)
+        return _cache
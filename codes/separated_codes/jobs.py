@@ -0,0 +1,170 @@
+import itertools
+import threading
+import traceback
+from queue import PriorityQueue
+
+# 숫자가 작을수록 먼저 실행
+PRIORITY_INTERACTIVE = 0  # 재예측 등 사용자가 기다리는 작업
+PRIORITY_ANALYSIS = 1
+PRIORITY_REPORT = 2
+
+
+class JobCancelled(Exception):
+    """CancelToken.check() 에서 취소가 확인되면 발생"""
+
+
+class CancelToken:
+    """
+    작업 하나의 취소 / 진행 상황 창구
+
+    작업은 단계 사이에서 check() 를 불러 취소되었으면 JobCancelled 로 빠져나오고,
+    report() 로 진행률(0~1)을 알림
+    """
+
+    def __init__(self, on_progress=None):
+        self._event = threading.Event()
+        self.on_progress = on_progress
+        self.progress = 0.0
+        self.message = ""
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise JobCancelled()
+
+    def report(self, fraction, message=""):
+        self.check()
+        self.progress = fraction
+        self.message = message
+        if self.on_progress is not None:
+            self.on_progress(fraction, message)
+
+
+class Job:
+    def __init__(self, fn, args, kwargs, priority, name, token):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.name = name
+        self.token = token
+        self.state = "queued"  # queued / running / done / failed / cancelled
+        self.result = None
+        self.exception = None
+        self._done = threading.Event()
+
+    def cancel(self):
+        self.token.cancel()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+
+class JobExecutor:
+    """
+    앱 전체에서 쓰는 상주 작업 실행기
+
+    작업은 우선순위 큐에서 꺼내 고정된 스레드들이 실행. 실행 중인 스레드를 강제로
+    끝내지 않고, CancelToken 으로 취소를 알려 작업이 단계 사이에서 스스로 멈추게 함.
+
+    분석 / 리포트처럼 중간에 끊을 수 없는 긴 작업이 일반 스레드를 모두 차지해도
+    재예측이 기다리지 않도록, reserved 개의 스레드는 PRIORITY_INTERACTIVE 작업만 실행
+    (interactive 작업은 양쪽 큐에 넣고 먼저 꺼낸 스레드가 실행)
+    """
+
+    def __init__(self, workers=2, reserved=1, name="job"):
+        self._queue = PriorityQueue()
+        self._interactive = PriorityQueue()
+        self._seq = itertools.count()
+        self._jobs = set()
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._loop, args=(self._queue,),
+                             name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self._reserved = [
+            threading.Thread(target=self._loop, args=(self._interactive,),
+                             name=f"{name}-interactive-{i}", daemon=True)
+            for i in range(reserved)
+        ]
+        for t in self._threads + self._reserved:
+            t.start()
+
+    def submit(self, fn, *args, priority=PRIORITY_ANALYSIS, name=None, token=None, **kwargs):
+        """fn(*args, **kwargs) 를 큐에 넣음. 취소는 반환된 Job.cancel() 또는 token 으로"""
+        job = Job(fn, args, kwargs, priority, name or getattr(fn, "__name__", "job"),
+                  token or CancelToken())
+        with self._lock:
+            self._jobs.add(job)
+        entry = (priority, next(self._seq), job)
+        self._queue.put(entry)
+        if priority <= PRIORITY_INTERACTIVE and self._reserved:
+            self._interactive.put(entry)
+        return job
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            job.cancel()
+
+    def shutdown(self, timeout=None):
+        """모든 작업을 취소하고 스레드가 끝나기를 기다림"""
+        self.cancel_all()
+        for _ in self._threads:
+            self._queue.put((float("inf"), next(self._seq), None))
+        for _ in self._reserved:
+            self._interactive.put((float("inf"), next(self._seq), None))
+        for t in self._threads + self._reserved:
+            t.join(timeout)
+
+    # ----------------------------------------------------------
+    def _loop(self, queue):
+        while True:
+            _, _, job = queue.get()
+            if job is None:
+                return
+
+            with self._lock:
+                if job.state != "queued":
+                    continue  # 다른 큐에서 이미 꺼내 실행한 작업
+                job.state = "cancelled" if job.token.cancelled else "running"
+
+            if job.state == "running":
+                try:
+                    job.result = job.fn(*job.args, **job.kwargs)
+                    job.state = "done"
+                except JobCancelled:
+                    job.state = "cancelled"
+                except Exception as e:
+                    job.exception = e
+                    job.state = "failed"
+                    traceback.print_exc()
+
+            with self._lock:
+                self._jobs.discard(job)
+            job._done.set()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_job_executor(workers=2, reserved=1):
+    """프로세스 전체에서 공유하는 작업 실행기 (분석 / 재예측 / 리포트 워커 공용)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = JobExecutor(workers, reserved)
+        return _executor
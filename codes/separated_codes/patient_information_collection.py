@@ -1,24 +1,14 @@
 import os
-import pydicom
 
-def collect_patient_information(dicom_folder):
+from dicom_index import get_index
+
+def collect_patient_information(dicom_folder, index=None):
     if not os.path.isdir(dicom_folder):
         raise ValueError(f"경로가 폴더가 아닙니다: {dicom_folder}")
 
-    dicom_files = []
-    for root, dirs, files in os.walk(dicom_folder):
-        for f in files:
-            if f.lower().endswith(".dcm"):
-                dicom_files.append(os.path.join(root, f))
-
-    if len(dicom_files) == 0:
-        raise FileNotFoundError("DICOM 파일을 찾을 수 없습니다.")
-
-    # 3. 첫 번째 DICOM 읽기
-    dcm_path = dicom_files[0]
-    ds = pydicom.dcmread(dcm_path, stop_before_pixels=True)
-
-    # 4. 환자 이름 가져오기
-    name = getattr(ds, "PatientName", "Unknown")
+    # 폴더 전체를 매번 다시 읽지 않도록 공유 header 인덱스 사용
+    if index is None:
+        index = get_index(dicom_folder)
 
-    return str(name)
+    # 분석 대상(가장 큰 series)의 환자 이름, DICOM 이 없으면 FileNotFoundError
+    return index.patient_name()
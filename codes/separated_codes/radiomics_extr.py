@@ -1,10 +1,17 @@
 import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import pandas as pd
 import SimpleITK as sitk
 import numpy as np
-from radiomics import featureextractor
+from radiomics import featureextractor, imageoperations
 import yaml
 
+from filter_cache import FilteredImageCache, image_digest, filter_key
+from volume import Volume, as_sitk
+
 FEATURE_COLS = [
     'original_shape_Sphericity', 'original_glszm_GrayLevelNonUniformity',
     'original_glszm_SmallAreaEmphasis', 'wavelet-LHL_firstorder_Mean',
@@ -42,6 +49,417 @@ FEATURE_COLS = [
 ]
 
 
+# feature 이름의 image type 접두사 → pyradiomics imageType (LoG/wavelet 은 아래에서 따로 처리)
+_SIMPLE_IMAGE_TYPES = {
+    "original": "Original",
+    "square": "Square",
+    "squareroot": "SquareRoot",
+    "logarithm": "Logarithm",
+    "exponential": "Exponential",
+    "gradient": "Gradient",
+}
+
+_LOG_PATTERN = re.compile(r"^log-sigma-(\d+)-(\d+)-mm-[23]D$")
+
+# 병렬 추출 시 오래 걸리는 그룹부터 제출 (대략적인 상대 비용)
+_GROUP_COST = {"Wavelet": 8, "LBP3D": 4, "LBP2D": 3, "LoG": 2}
+
+# 영상 전체의 최대 |값| 으로 스케일하는 점 연산 필터
+_GLOBAL_SCALE_TYPES = {"Square", "SquareRoot", "Logarithm", "Exponential"}
+
+# 캐시하지 않는 image type: Original 은 입력 그대로이고, 점 연산 필터는 다시 계산하는 것이
+# 디스크에서 읽는 것보다 빠름
+_UNCACHED_TYPES = {"Original"} | _GLOBAL_SCALE_TYPES
+
+# crop 상자를 이 voxel 배수로 넓혀 mask 를 조금 고쳐도 같은 crop (→ 필터 캐시 적중) 이 되도록 함
+CROP_GRID = 16
+
+# GUI 워커에서 사용하는 기본 프로세스 수 (프로세스마다 CT 한 장씩 메모리에 올림)
+EXTRACT_WORKERS = max(1, min(4, (os.cpu_count() or 1) // 2))
+
+# 프로세스 수별 풀 (GUI 작업과 batch_runner 가 동시에 추출해도 사용 중인 풀은 닫지 않음)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _resolve_image_type(type_name):
+    """'log-sigma-3-0-mm-3D' 같은 접두사를 (imageType, 필요한 custom 설정) 으로 변환"""
+    if type_name in _SIMPLE_IMAGE_TYPES:
+        return _SIMPLE_IMAGE_TYPES[type_name], {}
+    if type_name.startswith("wavelet"):
+        return "Wavelet", {}
+    m = _LOG_PATTERN.match(type_name)
+    if m:
+        return "LoG", {"sigma": [float(f"{m.group(1)}.{m.group(2)}")]}
+    if type_name.startswith("lbp-2D"):
+        return "LBP2D", {}
+    if type_name.startswith("lbp-3D"):
+        return "LBP3D", {}
+    raise ValueError(f"알 수 없는 image type: {type_name}")
+
+
+def _load_params(yaml_path):
+    if yaml_path and os.path.exists(yaml_path):
+        with open(yaml_path, "r", encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+    return {}
+
+
+def plan_extraction(feature_cols=FEATURE_COLS, yaml_path=None):
+    """
+    feature 목록을 만들어내는 최소 pyradiomics 설정을 계산
+
+    - imageType / featureClass / setting: pyradiomics 파라미터 dict 로 그대로 사용 가능
+    - targets: image type 이름(wavelet-LHL, log-sigma-3-0-mm-3D ...) 별로
+      실제로 계산할 feature class → feature 목록
+    """
+    params = _load_params(yaml_path)
+    yaml_types = params.get("imageType") or {}
+
+    image_types = {}
+    feature_classes = {}
+    targets = {}
+
+    for col in feature_cols:
+        type_name, class_name, feature_name = col.split("_", 2)
+        image_type, custom = _resolve_image_type(type_name)
+
+        if image_type not in image_types:
+            # yaml 의 custom 설정(binWidth 등)은 유지하고 sigma 만 필요한 것으로 교체
+            base = dict(yaml_types.get(image_type) or {})
+            base.pop("sigma", None)
+            image_types[image_type] = base
+        if "sigma" in custom:
+            sigmas = image_types[image_type].setdefault("sigma", [])
+            if custom["sigma"][0] not in sigmas:
+                sigmas.append(custom["sigma"][0])
+                sigmas.sort()
+
+        names = feature_classes.setdefault(class_name, [])
+        if feature_name not in names:
+            names.append(feature_name)
+
+        per_type = targets.setdefault(type_name, {}).setdefault(class_name, [])
+        if feature_name not in per_type:
+            per_type.append(feature_name)
+
+    return {
+        "imageType": image_types,
+        "featureClass": feature_classes,
+        "setting": dict(params.get("setting") or {}),
+        "targets": targets,
+    }
+
+
+def build_planned_extractor(plan):
+    params = {k: plan[k] for k in ("imageType", "featureClass", "setting")}
+    return featureextractor.RadiomicsFeatureExtractor(params)
+
+
+def _wanted_type_names(targets, image_type, args):
+    """image_type 생성기가 내놓는 결과 중 feature 계산에 쓰이는 이름 목록"""
+    names = []
+    for type_name, classes in targets.items():
+        resolved, needed = _resolve_image_type(type_name)
+        if resolved != image_type or not any(c != "shape" for c in classes):
+            continue
+        if "sigma" in needed and needed["sigma"][0] not in (args.get("sigma") or []):
+            continue
+        names.append(type_name)
+    return names
+
+
+def _filtered_images(image, mask, image_type, args, wanted, cache):
+    """필터 영상 생성기. cache 가 있으면 wanted 가 모두 캐시에 있을 때 필터를 건너뜀"""
+    generator = getattr(imageoperations, f"get{image_type}Image")
+    if cache is None or image_type in _UNCACHED_TYPES:
+        yield from generator(image, mask, **args)
+        return
+
+    digest = image_digest(image)
+    keys = {name: filter_key(digest, name, args) for name in wanted}
+    hits = {name: cache.get(key) for name, key in keys.items()}
+
+    if all(hit is not None for hit in hits.values()):
+        for name in wanted:
+            filtered, kwargs = hits[name]
+            yield filtered, name, kwargs
+        return
+
+    for filtered, type_name, kwargs in generator(image, mask, **args):
+        if type_name in keys:
+            cache.put(keys[type_name], filtered, kwargs)
+        yield filtered, type_name, kwargs
+
+
+def execute_plan(extractor, plan, img, mask, cache=None):
+    """
+    extractor.execute 와 같은 순서로 계산하되, image type 마다 plan 의
+    targets 에 있는 feature 만 계산 (필요 없는 wavelet 대역 등은 건너뜀)
+
+    cache(FilteredImageCache) 를 주면 필터 영상을 캐시에서 재사용
+    """
+    settings = extractor.settings.copy()
+    targets = plan["targets"]
+
+    image, mask = extractor.loadImage(img, mask, None, **settings)
+    bbox, corrected_mask = imageoperations.checkMask(image, mask, **settings)
+    if corrected_mask is not None:
+        mask = corrected_mask
+
+    features = {}
+
+    shape = targets.get("original", {}).get("shape")
+    if shape:
+        extractor.enabledFeatures = {"shape": shape}
+        features.update(extractor.computeShape(image, mask, bbox, **settings))
+
+    for image_type, custom in plan["imageType"].items():
+        args = settings.copy()
+        args.update(custom)
+        wanted = _wanted_type_names(targets, image_type, args)
+        if not wanted:
+            continue
+
+        for filtered, type_name, kwargs in _filtered_images(image, mask, image_type,
+                                                            args, wanted, cache):
+            if type_name not in wanted:
+                continue
+            extractor.enabledFeatures = {
+                c: f for c, f in targets[type_name].items() if c != "shape"
+            }
+            filtered, filtered_mask = imageoperations.cropToTumorMask(filtered, mask, bbox)
+            features.update(
+                extractor.computeFeatures(filtered, filtered_mask, type_name, **kwargs)
+            )
+
+    return features
+
+
+def filter_margin(image_type, custom, settings, spacing):
+    """
+    ROI 안의 필터 결과가 전체 영상에서 계산한 것과 같도록 ROI 주변에 남길 여백
+
+    Returns:
+        (x, y, z) 축별 voxel 수
+    """
+    args = dict(settings)
+    args.update(custom)
+
+    if image_type == "LoG":
+        # recursive gaussian 은 4 sigma 밖 기여가 무시할 만큼 작음
+        sigma = max(args.get("sigma") or [0.0])
+        return [int(np.ceil(4.0 * sigma / s)) + 1 for s in spacing]
+
+    if image_type == "Wavelet":
+        import pywt
+        dec_len = pywt.Wavelet(args.get("wavelet", "coif1")).dec_len
+        levels = args.get("start_level", 0) + args.get("level", 1)
+        # a trous 필터 지지 범위 + pyradiomics 가 2**level 배수로 맞추는 wrap padding
+        reach = (dec_len - 1) * (2 ** levels - 1) + 2 ** levels
+        return [reach] * 3
+
+    if image_type == "LBP3D":
+        radius = args.get("lbp3DIcosphereRadius", 1)
+        return [int(np.ceil(radius)) + 2] * 3
+
+    if image_type == "LBP2D":
+        radius = args.get("lbp2DRadius", 1)
+        return [int(np.ceil(radius)) + 2] * 3
+
+    if image_type == "Gradient":
+        return [2] * 3
+
+    return [1] * 3
+
+
+def _roi_box(mask, label):
+    """mask 에서 label 영역의 bounding box (sitk index 순서 x, y, z)"""
+    roi = sitk.GetArrayViewFromImage(mask) == label
+    if not roi.any():
+        raise ValueError(f"마스크에 label {label} 영역이 없습니다.")
+
+    lower, upper = [], []
+    for axis in range(3):
+        others = tuple(a for a in range(3) if a != axis)
+        idx = np.flatnonzero(roi.any(axis=others))
+        lower.append(int(idx[0]))
+        upper.append(int(idx[-1]))
+    # numpy 배열은 z, y, x 순서
+    return lower[::-1], upper[::-1]
+
+
+def crop_for_group(img, mask, group, grid=CROP_GRID):
+    """
+    그룹의 필터에 안전한 여백을 두고 영상/마스크를 ROI 주변으로 잘라냄
+
+    상자는 grid voxel 단위로 맞춰, 편집으로 ROI 가 조금 바뀌어도 잘라낸 영상이
+    같게 유지됨 (필터 캐시 키가 잘라낸 영상 기준이므로).
+    전역 최대 |값| 으로 스케일하는 필터(Square 등)는 잘라낸 영상의 마스크 밖
+    voxel 하나에 원래 영상의 극값을 넣어 같은 계수가 나오도록 맞춤
+    """
+    (image_type, custom), = group["imageType"].items()
+    label = group["setting"].get("label", 1)
+
+    lower, upper = _roi_box(mask, label)
+    margin = filter_margin(image_type, custom, group["setting"], img.GetSpacing())
+    size = img.GetSize()
+
+    index = [max(0, (lo - m) // grid * grid) for lo, m in zip(lower, margin)]
+    last = [min(n - 1, ((hi + m) // grid + 1) * grid - 1)
+            for hi, m, n in zip(upper, margin, size)]
+    extent = [b - a + 1 for a, b in zip(index, last)]
+
+    cropped_img = sitk.RegionOfInterest(img, extent, index)
+    cropped_mask = sitk.RegionOfInterest(mask, extent, index)
+
+    if image_type in _GLOBAL_SCALE_TYPES:
+        full = sitk.GetArrayViewFromImage(img)
+        lo_val, hi_val = full.min(), full.max()
+        extreme = hi_val if abs(hi_val) >= abs(lo_val) else lo_val
+
+        outside = np.flatnonzero(sitk.GetArrayViewFromImage(cropped_mask).ravel() != label)
+        if len(outside) == 0:
+            # 여백이 전혀 없으면 보정할 곳이 없으므로 전체 영상 사용
+            return img, mask
+
+        arr = sitk.GetArrayFromImage(cropped_img)
+        arr.flat[outside[0]] = extreme
+        patched = sitk.GetImageFromArray(arr)
+        patched.CopyInformation(cropped_img)
+        cropped_img = patched
+
+    return cropped_img, cropped_mask
+
+
+def split_plan(plan):
+    """plan 을 독립적으로 계산 가능한 그룹으로 분할 (image type 별, LoG 는 sigma 별)"""
+    groups = []
+    for image_type, custom in plan["imageType"].items():
+        if image_type == "LoG":
+            customs = [dict(custom, sigma=[s]) for s in custom.get("sigma", [])]
+        else:
+            customs = [custom]
+
+        for sub_custom in customs:
+            targets = {}
+            for type_name, classes in plan["targets"].items():
+                resolved, needed = _resolve_image_type(type_name)
+                if resolved != image_type:
+                    continue
+                if "sigma" in needed and needed["sigma"] != sub_custom.get("sigma"):
+                    continue
+                targets[type_name] = classes
+            if not targets:
+                continue
+
+            feature_classes = {}
+            for classes in targets.values():
+                for class_name, names in classes.items():
+                    merged = feature_classes.setdefault(class_name, [])
+                    merged.extend(n for n in names if n not in merged)
+
+            groups.append({
+                "imageType": {image_type: sub_custom},
+                "featureClass": feature_classes,
+                "setting": plan["setting"],
+                "targets": targets,
+            })
+
+    groups.sort(key=lambda g: -_GROUP_COST.get(next(iter(g["imageType"])), 1))
+    return groups
+
+
+def _execute_group(img, mask, group, crop=False, cache=None):
+    # crop 하면 캐시 키도 잘라낸 영상 기준 (ROI 가 같은 grid 상자 안이면 재사용)
+    if crop:
+        img, mask = crop_for_group(img, mask, group)
+    return execute_plan(build_planned_extractor(group), group, img, mask, cache)
+
+
+def _share_volume(image):
+    """메모리 영상을 shared memory 에 한 번 올려 워커들이 복사 없이 붙도록 함"""
+    volume = image if isinstance(image, Volume) else Volume.from_sitk(image)
+    arr = np.ascontiguousarray(volume.array)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+    spec = (shm.name, arr.shape, arr.dtype.str,
+            volume.spacing, volume.origin, volume.direction)
+    return shm, spec
+
+
+def _attach_volume(spec):
+    name, shape, dtype, spacing, origin, direction = spec
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        arr = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+        return Volume(arr, spacing, origin, direction).to_sitk()
+    finally:
+        shm.close()
+
+
+def _execute_group_remote(img_src, mask_src, group, crop=False, cache_dir=None):
+    # 프로세스 풀에서 실행: 경로면 각자 읽고, shared memory 면 붙어서 사용
+    # 그룹이 어느 워커에 갈지 정해지지 않으므로 캐시는 디스크 계층만 사용
+    img = sitk.ReadImage(img_src) if isinstance(img_src, str) else _attach_volume(img_src)
+    mask = sitk.ReadImage(mask_src) if isinstance(mask_src, str) else _attach_volume(mask_src)
+    cache = FilteredImageCache(max_bytes=0, cache_dir=cache_dir) if cache_dir else None
+    return _execute_group(img, mask, group, crop, cache)
+
+
+def execute_plan_cropped(plan, img, mask, cache=None):
+    """그룹별로 필요한 여백만큼 잘라낸 영상에서 순서대로 계산"""
+    features = {}
+    for group in split_plan(plan):
+        features.update(_execute_group(img, mask, group, crop=True, cache=cache))
+    return features
+
+
+def _get_pool(n_workers):
+    with _pools_lock:
+        pool = _pools.get(n_workers)
+        if pool is None:
+            pool = _pools[n_workers] = ProcessPoolExecutor(max_workers=n_workers)
+        return pool
+
+
+def execute_plan_parallel(plan, img_nii, mask_nii, n_workers, crop=False,
+                          cache_dir=None):
+    """
+    split_plan 의 그룹을 프로세스 풀에 나눠 계산하고 결과를 합침
+
+    img/mask 는 경로 또는 메모리 영상(Volume, sitk.Image). 메모리 영상은
+    shared memory 로 한 번만 넘김
+    """
+    groups = split_plan(plan)
+    pool = _get_pool(min(n_workers, len(groups)))
+
+    shared = []
+    sources = []
+    for image in (img_nii, mask_nii):
+        if isinstance(image, str):
+            sources.append(image)
+        else:
+            shm, spec = _share_volume(image)
+            shared.append(shm)
+            sources.append(spec)
+
+    try:
+        futures = [
+            pool.submit(_execute_group_remote, sources[0], sources[1], g, crop, cache_dir)
+            for g in groups
+        ]
+
+        features = {}
+        for fut in futures:
+            features.update(fut.result())
+        return features
+    finally:
+        for shm in shared:
+            shm.close()
+            shm.unlink()
+
+
 def build_extractor(yaml_path):
 
     if yaml_path and os.path.exists(yaml_path):
@@ -54,14 +472,40 @@ def build_extractor(yaml_path):
     return ext
 
 
-def extract_radiomics(img_nii, mask_nii, yaml_path):
+def extract_radiomics(img_nii, mask_nii, yaml_path, planned=True, n_workers=1,
+                      crop=False, cache=None):
+    """
+    img_nii / mask_nii 는 NIfTI 경로, Volume, sitk.Image 모두 가능
 
-    extractor = build_extractor(yaml_path)
+    cache(FilteredImageCache) 를 주면 필터 영상을 캐시/재사용. crop=True 와 같이
+    쓰면 잘라낸 영상 기준으로 저장됨. 병렬 모드에서는 캐시의 디스크 계층이 있어야 공유됨
+    """
 
-    img = sitk.ReadImage(img_nii)
-    mask = sitk.ReadImage(mask_nii)
+    if (n_workers > 1 or crop or cache is not None) and not planned:
+        raise ValueError("병렬/ROI crop/캐시 추출은 planned 모드에서만 지원됩니다.")
 
-    raw_features = extractor.execute(img, mask)
+    if planned:
+        # FEATURE_COLS 에 필요한 필터/feature 만 계산
+        plan = plan_extraction(FEATURE_COLS, yaml_path)
+        cache_dir = cache.cache_dir if cache is not None else None
+        if n_workers > 1 and (cache is None or cache_dir):
+            raw_features = execute_plan_parallel(plan, img_nii, mask_nii, n_workers,
+                                                 crop, cache_dir)
+        else:
+            img = as_sitk(img_nii)
+            mask = as_sitk(mask_nii)
+            if crop:
+                raw_features = execute_plan_cropped(plan, img, mask, cache)
+            elif cache is not None:
+                raw_features = execute_plan(build_planned_extractor(plan), plan,
+                                            img, mask, cache)
+            else:
+                raw_features = execute_plan(build_planned_extractor(plan), plan, img, mask)
+    else:
+        img = as_sitk(img_nii)
+        mask = as_sitk(mask_nii)
+        extractor = build_extractor(yaml_path)
+        raw_features = extractor.execute(img, mask)
 
 
     selected = {}
@@ -81,3 +525,26 @@ def extract_radiomics(img_nii, mask_nii, yaml_path):
 
     df = pd.DataFrame([selected])
     return df
+
+
+def verify_extraction(img_nii, mask_nii, yaml_path, rtol=1e-9, atol=0.0, **kwargs):
+    """
+    전체 설정(yaml 그대로) 추출 결과와 kwargs 로 지정한 추출 방식의 결과를 비교
+    (crop=True 는 필터 가장자리 차이가 있으므로 rtol=1e-3 정도로 비교)
+
+    Returns:
+        일치하지 않는 feature → (전체 설정 값, 비교 대상 값). 비어 있으면 일치
+    """
+    reference = extract_radiomics(img_nii, mask_nii, yaml_path, planned=False)
+    candidate = extract_radiomics(img_nii, mask_nii, yaml_path, **kwargs)
+
+    mismatches = {}
+    for feat in FEATURE_COLS:
+        ref = float(reference.at[0, feat])
+        val = float(candidate.at[0, feat])
+        if np.isnan(ref) and np.isnan(val):
+            continue
+        if not np.isclose(val, ref, rtol=rtol, atol=atol):
+            mismatches[feat] = (ref, val)
+
+    return mismatches
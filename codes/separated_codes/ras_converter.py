@@ -2,28 +2,42 @@ import os
 import tempfile
 import SimpleITK as sitk
 
+from dicom_index import get_index
+from volume import Volume
 
-def dicom_to_nifti_ras(dicom_folder):
-    
-    reader = sitk.ImageSeriesReader()
-    series_ids = reader.GetGDCMSeriesIDs(dicom_folder)
-    if not series_ids:
+
+def select_series(dicom_folder, index=None):
+    """파일 수가 가장 많은 series 의 (SeriesInstanceUID, 정렬된 파일 목록)"""
+    if index is None:
+        index = get_index(dicom_folder)
+    try:
+        return index.largest_series()
+    except FileNotFoundError:
         raise ValueError(f"No DICOM series found: {dicom_folder}")
-    
-    best_id = max(series_ids, key=lambda s: len(reader.GetGDCMSeriesFileNames(dicom_folder, s)))
-    files = reader.GetGDCMSeriesFileNames(dicom_folder, best_id)
+
+
+def dicom_to_volume(dicom_folder, files=None):
+    """가장 큰 series 를 RAS 방향 Volume 으로 (디스크에 쓰지 않음)"""
+    reader = sitk.ImageSeriesReader()
+    if files is None:
+        _, files = select_series(dicom_folder)
 
     reader.SetFileNames(files)
     img = reader.Execute()
 
     ras_img = sitk.DICOMOrient(img, "RAS")
+    return Volume.from_sitk(ras_img)
 
-    temp_root = os.path.join(tempfile.gettempdir(), "Pyramid_RAS")
-    os.makedirs(temp_root, exist_ok=True)
 
-    base_name = os.path.basename(dicom_folder.rstrip("/\\"))
-    out_path = os.path.join(temp_root, f"{base_name}_RAS.nii.gz")
+def dicom_to_nifti_ras(dicom_folder, out_dir=None, files=None):
+    
+    volume = dicom_to_volume(dicom_folder, files)
 
-    sitk.WriteImage(ras_img, out_path)
+    if out_dir is None:
+        out_dir = os.path.join(tempfile.gettempdir(), "Pyramid_RAS")
+    os.makedirs(out_dir, exist_ok=True)
+
+    base_name = os.path.basename(dicom_folder.rstrip("/\\"))
+    out_path = os.path.join(out_dir, f"{base_name}_RAS.nii.gz")
 
-    return out_path
+    return volume.save(out_path)
@@ -0,0 +1,213 @@
+import os
+import time
+import queue
+import itertools
+import threading
+import traceback
+import multiprocessing
+
+from volume import Volume
+
+class SegmentationError(RuntimeError):
+    """segmentation 서버 시작 실패 / 서버 종료 / TotalSegmentator 예외 (메시지에 원인 포함)"""
+
+
+# nnUNetPredictor 가 불러온 뒤 다시 쓸 수 있는 상태 (가중치, plan, 네트워크)
+_PREDICTOR_STATE = (
+    "plans_manager", "configuration_manager", "list_of_parameters", "network",
+    "dataset_json", "trainer_name", "allowed_mirroring_axes", "label_manager",
+)
+
+
+def _memoize_predictor_init():
+    """
+    서버 프로세스 안에서 nnU-Net 모델 로딩을 한 번만 하도록 함
+
+    totalsegmentator 는 호출마다 새 nnUNetPredictor 를 만들어 가중치를 다시 읽으므로,
+    같은 모델 폴더/fold/checkpoint 면 처음 읽은 상태를 새 predictor 에 복사
+    """
+    try:
+        from nnunetv2.inference.predict_from_raw_data import nnUNetPredictor
+    except ImportError:
+        return  # 설치된 버전이 다르면 모델 로딩만 매번 하고 나머지는 그대로 재사용
+
+    original = nnUNetPredictor.initialize_from_trained_model_folder
+    loaded = {}
+
+    def initialize(self, model_training_output_dir, use_folds, checkpoint_name="checkpoint_final.pth"):
+        key = (os.path.abspath(model_training_output_dir),
+               tuple(use_folds) if use_folds is not None else None,
+               checkpoint_name, str(getattr(self, "device", "")))
+        state = loaded.get(key)
+        if state is None:
+            original(self, model_training_output_dir, use_folds, checkpoint_name)
+            loaded[key] = {k: v for k, v in self.__dict__.items() if k in _PREDICTOR_STATE}
+        else:
+            self.__dict__.update(state)
+
+    nnUNetPredictor.initialize_from_trained_model_folder = initialize
+
+
+def _serve(requests, results):
+    # 서버 프로세스 본체: torch / 모델을 한 번 올려 두고 요청을 차례로 처리
+    try:
+        from totalsegmentation import run_TS_volume
+        _memoize_predictor_init()
+    except Exception:
+        results.put(("error", None, traceback.format_exc()))
+        return
+    results.put(("ready", None, None))
+
+    while True:
+        item = requests.get()
+        if item is None:
+            return
+        job_id, (array, spacing, origin, direction), options = item
+        try:
+            mask = run_TS_volume(Volume(array, spacing, origin, direction),
+                                 raise_errors=True, **options)
+            results.put((job_id, None if mask is None else mask.array, None))
+        except Exception:
+            results.put((job_id, None, traceback.format_exc()))
+
+
+class SegmentationServer:
+    """
+    TotalSegmentator 를 계속 띄워 두는 로컬 작업 프로세스
+
+    segment() 는 여러 스레드(GUI 워커, batch_runner 단계 풀)에서 동시에 불러도 되고,
+    요청은 큐로 들어가 서버가 하나씩 처리. 서버가 죽으면 다시 띄우고 진행 중이던
+    요청을 한 번 더 보냄
+    """
+
+    def __init__(self, start_timeout=600):
+        self.start_timeout = start_timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending = {}  # job_id -> [Event, 결과 array, 에러]
+        self._process = None
+        self._reader = None
+
+    # ----------------------------------------------------------
+    def _ensure_started(self):
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                return
+            self._requests = self._ctx.Queue()
+            self._results = self._ctx.Queue()
+            self._process = self._ctx.Process(target=_serve, args=(self._requests, self._results),
+                                              name="totalsegmentator-server", daemon=True)
+            self._process.start()
+
+            kind, err = None, None
+            deadline = time.monotonic() + self.start_timeout
+            while time.monotonic() < deadline:
+                try:
+                    kind, _, err = self._results.get(timeout=1.0)
+                    break
+                except queue.Empty:
+                    if not self._process.is_alive():
+                        err = f"서버 프로세스가 종료되었습니다 (exit code {self._process.exitcode})"
+                        break
+            if kind != "ready":
+                process, self._process = self._process, None
+                if process.is_alive():
+                    process.kill()
+                raise SegmentationError(
+                    f"segmentation 서버를 시작하지 못했습니다.\n{err or '시작 시간 초과'}")
+
+            self._reader = threading.Thread(target=self._read_results,
+                                            args=(self._process, self._results), daemon=True)
+            self._reader.start()
+
+    def _read_results(self, process, results):
+        while True:
+            try:
+                job_id, array, err = results.get(timeout=1.0)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                # 서버가 죽음 - 기다리던 요청은 재시도하도록 알림
+                with self._lock:
+                    pending = list(self._pending.values())
+                for slot in pending:
+                    if not slot[0].is_set():
+                        slot[2] = "server died"
+                        slot[0].set()
+                return
+
+            with self._lock:
+                slot = self._pending.get(job_id)
+            if slot is not None:
+                slot[1], slot[2] = array, err
+                slot[0].set()
+
+    # ----------------------------------------------------------
+    def segment(self, volume, retries=1, **options):
+        """
+        CT Volume → 췌장 mask Volume (mask 가 없으면 None)
+
+        options 는 run_TS_volume 인자. 서버가 죽으면 다시 띄워
+        retries 번까지 재시도하고, 그래도 실패하거나 TotalSegmentator 에서 예외가
+        나면 원인을 담은 SegmentationError
+        """
+        for attempt in range(retries + 1):
+            self._ensure_started()
+
+            job_id = next(self._ids)
+            slot = [threading.Event(), None, None]
+            with self._lock:
+                self._pending[job_id] = slot
+                requests, process = self._requests, self._process
+            try:
+                requests.put((job_id, (volume.array, volume.spacing, volume.origin,
+                                       volume.direction), options))
+                # reader 가 서버 종료를 알리기 전에 등록된 요청도 놓치지 않도록 직접 확인
+                while not slot[0].wait(1.0):
+                    if not process.is_alive():
+                        slot[2] = "server died"
+                        break
+                exitcode = process.exitcode
+            finally:
+                with self._lock:
+                    self._pending.pop(job_id, None)
+
+            array, err = slot[1], slot[2]
+            if err == "server died":
+                if attempt < retries:
+                    print("⚠️ segmentation 서버가 종료되어 다시 시작합니다.")
+                    continue
+                raise SegmentationError(
+                    f"segmentation 서버가 작업 중 종료되었습니다 (exit code {exitcode})")
+            if err is not None:
+                raise SegmentationError(f"segmentation 실패:\n{err}")
+            return None if array is None else volume.like(array)
+
+    def stop(self):
+        with self._lock:
+            process = self._process
+            self._process = None
+        if process is not None and process.is_alive():
+            self._requests.put(None)
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_segmentation_server():
+    """프로세스 전체에서 공유하는 segmentation 서버 (분석 워커 / batch_runner 공용)"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = SegmentationServer()
+        return _server
+
+
+def segment_volume(volume):
+    """run_TS_volume 과 같은 결과를 상주 서버에서 계산"""
+    return get_segmentation_server().segment(volume)
@@ -1,3 +1,6 @@
+import os
+import time
+import threading
 import pandas as pd
 import torch
 import pickle
@@ -90,59 +93,299 @@ class FTTransformer(nn.Module):
 
 
 # =========================================================
-#   2) Prediction Function (GUI에서 사용)
+#   2) Inference Session (모델/스케일러 1회 로드 후 상주)
 # =========================================================
-def predict_with_model(df, name, model_path, scaler_path,
-                       threshold=0.5, log_callback=None):
-
-    try:
-        if log_callback:
-            log_callback("노스트라사무스 집중 중...")
-
-        # ---------------------------
-        #  Missing Feature Check
-        # ---------------------------
-        missing = [c for c in FEATURE_COLS if c not in df.columns]
-        if missing:
-            raise ValueError(f"Radiomics feature 누락: {missing}")
+class InferenceSession:
+    def __init__(self, model_path, scaler_path, device="cpu"):
+        self.device = device
 
-        # ---------------------------
-        #  Load model + scaler
-        # ---------------------------
-        model = FTTransformer(
+        self.model = FTTransformer(
             input_dim=len(FEATURE_COLS),
             d_model=64,
             num_heads=4,
             num_layers=4,
             dropout=0.229281172808302
         )
-        model.load_state_dict(torch.load(model_path, map_location="cpu"))
-        model.eval()
+        self.model.load_state_dict(torch.load(model_path, map_location=device))
+        self.model.to(device)
+        self.model.eval()
 
         with open(scaler_path, "rb") as f:
-            scaler = pickle.load(f)
+            self.scaler = pickle.load(f)
 
-        # ---------------------------
-        #  Preprocess
-        # ---------------------------
-        X = df[FEATURE_COLS].values
-        X_scaled = scaler.transform(X)
-        X_tensor = torch.tensor(X_scaled, dtype=torch.float32)
+        self._lock = threading.Lock()
+        self._explainer = None
+        self._check_feature_order()
+        self._warmup()
 
-        # ---------------------------
-        #  Predict (stable sigmoid)
-        # ---------------------------
+    def _check_feature_order(self):
+        # 스케일러가 DataFrame 으로 학습됐다면 컬럼 순서까지 확인
+        names = getattr(self.scaler, "feature_names_in_", None)
+        if names is not None and list(names) != FEATURE_COLS:
+            raise ValueError("스케일러의 feature 순서가 FEATURE_COLS 와 다릅니다.")
+
+        n_features = getattr(self.scaler, "n_features_in_", len(FEATURE_COLS))
+        if n_features != len(FEATURE_COLS):
+            raise ValueError(
+                f"스케일러 feature 수({n_features})가 FEATURE_COLS({len(FEATURE_COLS)})와 다릅니다."
+            )
+
+    def _warmup(self):
+        # 첫 요청에서 커널 초기화 비용을 내지 않도록 미리 한 번 실행
         with torch.no_grad():
-            logits = model(X_tensor).cpu().numpy()
+            self.model(torch.zeros(2, len(FEATURE_COLS), device=self.device))
+
+    def predict_batch(self, X):
+        """(n, len(FEATURE_COLS)) 배열 → 비정상 확률 (n,)"""
+        X_scaled = self.scaler.transform(np.asarray(X, dtype=np.float64))
+        X_tensor = torch.tensor(X_scaled, dtype=torch.float32, device=self.device)
+
+        logits = self.logits_scaled(X_tensor)
+        return 1 / (1 + np.exp(-logits))  # stable sigmoid
+
+    def logits_scaled(self, X_tensor):
+        """스케일된 입력 tensor → logit (numpy)"""
+        with self._lock, torch.no_grad():
+            return self.model(X_tensor).cpu().numpy()
+
+    def get_explainer(self, **kwargs):
+        """세션에 묶인 SHAP explainer (background 는 처음 한 번만 계산)"""
+        if self._explainer is None:
+            self._explainer = FTTransformerExplainer(self, **kwargs)
+        return self._explainer
+
+    def predict(self, df):
+        missing = [c for c in FEATURE_COLS if c not in df.columns]
+        if missing:
+            raise ValueError(f"Radiomics feature 누락: {missing}")
+
+        return self.predict_batch(df[FEATURE_COLS].values)
+
+    def predict_stream(self, rows, batch_size=256, threshold=0.5):
+        """
+        (patient_id, feature row) 스트림을 micro-batch 로 묶어 예측
+
+        Yields:
+            (patient_id, 확률, "비정상"/"정상") - 입력 순서 그대로
+        """
+        for ids, X in iter_micro_batches(rows, batch_size):
+            probs = self.predict_batch(X)
+            for pid, prob in zip(ids, probs):
+                prob = float(prob)
+                yield pid, prob, "비정상" if prob >= threshold else "정상"
+
+
+def _row_values(pid, row):
+    # pd.Series / dict / 한 줄짜리 DataFrame 을 FEATURE_COLS 순서 배열로 변환
+    if isinstance(row, pd.DataFrame):
+        if len(row) != 1:
+            raise ValueError(f"환자 {pid}: feature 행이 {len(row)}개입니다.")
+        row = row.iloc[0]
+
+    missing = [c for c in FEATURE_COLS if c not in row]
+    if missing:
+        raise ValueError(f"환자 {pid}: Radiomics feature 누락: {missing}")
+
+    return np.array([row[c] for c in FEATURE_COLS], dtype=np.float64)
+
+
+def iter_micro_batches(rows, batch_size):
+    """(patient_id, feature row) 스트림 → (id 목록, (n, 41) 배열) micro-batch"""
+    if isinstance(rows, pd.DataFrame):
+        rows = rows.iterrows()
+
+    ids, block = [], []
+    for pid, row in rows:
+        ids.append(pid)
+        block.append(_row_values(pid, row))
+        if len(block) == batch_size:
+            yield ids, np.vstack(block)
+            ids, block = [], []
+
+    if block:
+        yield ids, np.vstack(block)
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_inference_session(model_path, scaler_path, device="cpu"):
+    """프로세스 전체에서 공유하는 세션 (경로별 1회 로드)"""
+    key = (os.path.abspath(model_path), os.path.abspath(scaler_path), device)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = InferenceSession(model_path, scaler_path, device)
+            _sessions[key] = session
+        return session
+
 
-        logits = np.squeeze(logits)
-        probs = 1 / (1 + np.exp(-logits))  # stable sigmoid
+def predict_cohort(rows, model_path, scaler_path, threshold=0.5, batch_size=256,
+                   log_callback=None):
+    """
+    여러 환자의 radiomics 행을 batch_size 단위 forward pass 로 예측
+
+    Args:
+        rows: patient_id 를 index 로 하는 DataFrame 또는 (patient_id, row) 반복자
+    Returns:
+        PatientID / Probability / Prediction DataFrame (입력 순서)
+    """
+    session = get_inference_session(model_path, scaler_path)
+
+    records = []
+    for pid, prob, pred in session.predict_stream(rows, batch_size, threshold):
+        records.append({"PatientID": pid, "Probability": prob, "Prediction": pred})
+        if log_callback and len(records) % batch_size == 0:
+            log_callback(f"{len(records)}명 예측 완료")
+
+    if log_callback:
+        log_callback(f"총 {len(records)}명 예측 완료")
+
+    return pd.DataFrame(records, columns=["PatientID", "Probability", "Prediction"])
+
+
+# =========================================================
+#   3) SHAP Explainer (Kernel SHAP, batched coalition)
+# =========================================================
+class FTTransformerExplainer:
+    """
+    logit 기준 Kernel SHAP
+
+    - background 행은 스케일된 공간에서 한 번만 만들어 tensor 로 보관
+    - coalition 은 Shapley kernel 분포에서 보수와 짝지어 뽑고,
+      coalition x background 조합 전체를 큰 batch forward 로 계산
+    - max_coalitions 또는 time_budget(초) 중 먼저 닿는 쪽에서 멈춤
+    """
+
+    def __init__(self, session, background=None, n_background=16,
+                 max_coalitions=2048, time_budget=1.0, batch_rows=32768, seed=0):
+        self.session = session
+        self.max_coalitions = max_coalitions
+        self.time_budget = time_budget
+        self.batch_rows = batch_rows
+        self.seed = seed
+
+        self.background = self._build_background(background, n_background)
+        self.base_value = float(self._logits(self.background).mean())
+
+    def _build_background(self, background, n_background):
+        scaler = self.session.scaler
+
+        if isinstance(background, str):
+            background = (pd.read_csv(background) if background.endswith(".csv")
+                          else np.load(background))
+        if isinstance(background, pd.DataFrame):
+            background = background[FEATURE_COLS].values
+
+        if background is None:
+            # 학습 데이터가 없으면 스케일된 공간의 원점 한 행을 기준으로 사용.
+            # scaler.pkl 은 RobustScaler 라 원점은 feature 별 중앙값 (평균 환자가 아님)
+            X_scaled = np.zeros((1, len(FEATURE_COLS)))
+        else:
+            X = np.asarray(background, dtype=np.float64)
+            if len(X) > n_background:
+                rng = np.random.default_rng(self.seed)
+                X = X[rng.choice(len(X), n_background, replace=False)]
+            X_scaled = scaler.transform(X)
+
+        return torch.tensor(X_scaled, dtype=torch.float32, device=self.session.device)
+
+    def _logits(self, X_tensor):
+        return np.concatenate([
+            self.session.logits_scaled(X_tensor[i:i + self.batch_rows])
+            for i in range(0, len(X_tensor), self.batch_rows)
+        ])
+
+    def _coalition_values(self, x, Z):
+        # (n, 1, M) coalition 과 (1, k, M) background 를 섞어 n*k 행을 한 번에 forward
+        z = torch.as_tensor(Z, dtype=torch.float32, device=x.device)[:, None, :]
+        mixed = z * x + (1 - z) * self.background[None]
+        logits = self._logits(mixed.reshape(-1, x.shape[-1]))
+        return logits.reshape(len(Z), -1).mean(axis=1)
+
+    @staticmethod
+    def _sample_coalitions(rng, n_pairs, M):
+        sizes = np.arange(1, M)
+        weights = (M - 1) / (sizes * (M - sizes))
+        s = rng.choice(sizes, size=n_pairs, p=weights / weights.sum())
+
+        # 행마다 무작위 순위를 매겨 앞의 s 개 feature 를 켬
+        ranks = rng.random((n_pairs, M)).argsort(axis=1).argsort(axis=1)
+        Z = ranks < s[:, None]
+        return np.concatenate([Z, ~Z])
+
+    def explain(self, row, top_k=10, pairs_per_round=128):
+        """
+        한 환자의 feature 행(raw) → |SHAP| 상위 top_k 의 Feature / SHAP_Value DataFrame
+        """
+        start = time.perf_counter()
+        rng = np.random.default_rng(self.seed)
+        M = len(FEATURE_COLS)
+
+        X_scaled = self.session.scaler.transform(np.asarray(row, dtype=np.float64)[None])
+        x = torch.tensor(X_scaled[0], dtype=torch.float32, device=self.session.device)
+        fx = float(self._logits(x[None])[0])
+
+        Zs, ys = [], []
+        n = 0
+        while n < self.max_coalitions:
+            n_pairs = max(1, min(pairs_per_round, (self.max_coalitions - n) // 2))
+            Z = self._sample_coalitions(rng, n_pairs, M)
+            Zs.append(Z)
+            ys.append(self._coalition_values(x, Z))
+            n += len(Z)
+            # 연립방정식이 풀릴 만큼은 모은 뒤에만 시간 예산 적용
+            if n >= 2 * M and time.perf_counter() - start > self.time_budget:
+                break
+
+        # sum(phi) = f(x) - base 제약을 마지막 feature 소거로 넣은 최소제곱
+        Z = np.concatenate(Zs).astype(np.float64)
+        y = np.concatenate(ys) - self.base_value
+        delta = fx - self.base_value
+
+        A = Z[:, :-1] - Z[:, -1:]
+        b = y - Z[:, -1] * delta
+        phi_rest = np.linalg.lstsq(A, b, rcond=None)[0]
+        phi = np.append(phi_rest, delta - phi_rest.sum())
+
+        df = pd.DataFrame({"Feature": FEATURE_COLS, "SHAP_Value": phi})
+        order = df["SHAP_Value"].abs().sort_values(ascending=False).index
+        df = df.loc[order].head(top_k).reset_index(drop=True)
+        df.attrs.update(
+            base_value=self.base_value,
+            n_coalitions=n,
+            elapsed=time.perf_counter() - start,
+        )
+        return df
+
+
+# =========================================================
+#   4) Prediction Function (GUI에서 사용)
+# =========================================================
+def predict_with_model(df, name, model_path, scaler_path,
+                       threshold=0.5, log_callback=None, top_k=10):
+    """
+    Returns:
+        (예측 결과 df, SHAP 상위 feature df) - 실패 시 (None, None)
+        SHAP 은 환자 한 명일 때만 계산
+    """
+
+    try:
+        if log_callback:
+            log_callback("노스트라사무스 집중 중...")
+
+        # ---------------------------
+        #  Load (once) + Predict
+        # ---------------------------
+        session = get_inference_session(model_path, scaler_path)
+        probs = session.predict(df)
 
         # ---------------------------
         #  Single case
         # ---------------------------
-        if np.isscalar(probs):
-            prob = float(probs)
+        if len(probs) == 1:
+            prob = float(probs[0])
             pred = "비정상" if prob >= threshold else "정상"
 
             df["Probability"] = [prob]
@@ -150,11 +393,17 @@ def predict_with_model(df, name, model_path, scaler_path,
 
             if log_callback:
                 log_callback(f"환자 {name}의 비정상 예측 결과는 {prob*100:.2f}% 확률로 {pred}입니다.")
+                log_callback("SHAP 계산 중...")
+
+            top_features_df = session.get_explainer().explain(
+                df[FEATURE_COLS].values[0], top_k=top_k
+            )
 
         else:
             # ---------------------------
             #  Multiple cases
             # ---------------------------
+            top_features_df = None
             df["Probability"] = probs
             df["Prediction"] = [
                 "비정상" if p >= threshold else "정상" for p in probs
@@ -166,9 +415,9 @@ def predict_with_model(df, name, model_path, scaler_path,
                     f"({'비정상' if probs[0] >= threshold else '정상'})"
                 )
 
-        return df
+        return df, top_features_df
 
     except Exception as e:
         if log_callback:
             log_callback(f"돌팔이였습니다...: {str(e)}")
-        return None
+        return None, None
@@ -1,13 +1,20 @@
 import traceback
 from totalsegmentator.python_api import totalsegmentator
+from totalsegmentator.map_to_binary import class_map
 import os
 import tempfile
+import numpy as np
 
-def run_TS(nifti):
-    temp_root = os.path.join(tempfile.gettempdir(), "Pyramid_RAS")
-    os.makedirs(temp_root, exist_ok=True)
+from volume import Volume
 
-    out_dir = os.path.join(temp_root, "RAS_output")
+def run_TS(nifti, out_dir=None):
+    # Volume 이 들어오면 파일을 거치지 않고 mask Volume 을 반환
+    if isinstance(nifti, Volume):
+        return run_TS_volume(nifti)
+
+    if out_dir is None:
+        temp_root = os.path.join(tempfile.gettempdir(), "Pyramid_RAS")
+        out_dir = os.path.join(temp_root, "RAS_output")
     os.makedirs(out_dir, exist_ok=True)
 
     try:
@@ -28,3 +35,39 @@ def run_TS(nifti):
     except Exception as e:
         traceback.print_exc()
         return None
+
+
+def _segment_zyx(volume, **kwargs):
+    # output=None 이면 class_map 번호가 들어 있는 multilabel 영상이 반환됨
+    seg_img = totalsegmentator(
+        input=volume.to_nibabel(),
+        output=None,
+        task="total",
+        roi_subset=["pancreas"],
+        **kwargs
+    )
+    label = next(k for k, v in class_map["total"].items() if v == "pancreas")
+    mask_xyz = np.asanyarray(seg_img.dataobj) == label
+    return np.ascontiguousarray(mask_xyz.transpose(2, 1, 0), dtype=np.uint8)
+
+
+def run_TS_volume(volume, raise_errors=False):
+    """
+    CT Volume → 췌장 mask Volume (췌장이 없으면 None)
+
+    roi_subset 을 주면 TotalSegmentator 가 이미 저해상도(6mm) 모델로 위치를 찾아
+    그 주변만 원해상도로 계산하므로 따로 crop 하지 않음.
+    raise_errors=False 면 실패도 None 으로 반환, True 면 예외를 그대로 올림
+    """
+    try:
+        mask = _segment_zyx(volume)
+        if not mask.any():
+            return None
+
+        return volume.like(mask)
+
+    except Exception as e:
+        if raise_errors:
+            raise
+        traceback.print_exc()
+        return None
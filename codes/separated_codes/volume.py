@@ -0,0 +1,156 @@
+import os
+import time
+import tempfile
+
+import numpy as np
+import SimpleITK as sitk
+
+# SimpleITK(LPS) ↔ nibabel(RAS) 좌표 변환
+_LPS_TO_RAS = np.diag([-1.0, -1.0, 1.0])
+
+# 디스크 사본이 없는 영상을 뷰어용으로 memory-map 할 때 쓰는 곳
+VIEW_CACHE_DIR = os.path.join(tempfile.gettempdir(), "Pyramid_RAS", "view_cache")
+VIEW_CACHE_MAX_AGE = 24 * 3600
+
+
+class Volume:
+    """
+    단계 사이에서 디스크를 거치지 않고 넘기는 영상
+
+    array 는 SimpleITK 순서 (z, y, x). 뷰어/nibabel 은 xyz() 로 (x, y, z) 뷰를 사용.
+    path 는 디스크에 저장된 사본이 있을 때만 채워짐
+    """
+
+    def __init__(self, array, spacing, origin, direction, path=None):
+        self.array = array
+        self.spacing = tuple(float(v) for v in spacing)
+        self.origin = tuple(float(v) for v in origin)
+        self.direction = tuple(float(v) for v in direction)
+        self.path = path
+
+    # ----------------------------------------------------------
+    @classmethod
+    def from_sitk(cls, img, path=None):
+        return cls(sitk.GetArrayFromImage(img), img.GetSpacing(), img.GetOrigin(),
+                   img.GetDirection(), path)
+
+    @classmethod
+    def from_file(cls, path, mmap=False):
+        """
+        mmap=True 이고 비압축 .nii 면 voxel 을 읽지 않고 memory-map 으로 열어
+        원래 정수 dtype 그대로 필요한 slice 만 읽음
+        """
+        if mmap and path.endswith(".nii"):
+            volume = cls._from_nifti_mmap(path)
+            if volume is not None:
+                return volume
+        return cls.from_sitk(sitk.ReadImage(path), path)
+
+    @classmethod
+    def _from_nifti_mmap(cls, path):
+        import nibabel as nib
+        img = nib.load(path, mmap="r")
+        proxy = img.dataobj
+        slope, inter = getattr(proxy, "slope", 1.0), getattr(proxy, "inter", 0.0)
+        if len(img.shape) != 3 or slope != 1.0 or inter != 0.0:
+            return None  # 정수 그대로 쓸 수 없는 영상은 일반 경로로
+
+        # 디스크 순서는 x 가 가장 빠르므로 전치하면 (z, y, x) C-order 뷰
+        array = proxy.get_unscaled().T
+
+        linear = img.affine[:3, :3]
+        spacing = np.linalg.norm(linear, axis=0)
+        direction = _LPS_TO_RAS @ (linear / spacing)
+        origin = _LPS_TO_RAS @ img.affine[:3, 3]
+        return cls(array, spacing, origin, direction.ravel(), path)
+
+    def to_sitk(self):
+        img = sitk.GetImageFromArray(self.array)
+        img.SetSpacing(self.spacing)
+        img.SetOrigin(self.origin)
+        img.SetDirection(self.direction)
+        return img
+
+    def save(self, path):
+        """디스크 사본 저장 (확장자 .nii 면 비압축)"""
+        sitk.WriteImage(self.to_sitk(), path)
+        self.path = path
+        return path
+
+    # ----------------------------------------------------------
+    def affine(self):
+        """nibabel 용 RAS affine"""
+        direction = np.array(self.direction).reshape(3, 3)
+        affine = np.eye(4)
+        affine[:3, :3] = _LPS_TO_RAS @ direction @ np.diag(self.spacing)
+        affine[:3, 3] = _LPS_TO_RAS @ np.array(self.origin)
+        return affine
+
+    def to_nibabel(self):
+        import nibabel as nib
+        return nib.Nifti1Image(self.xyz(), self.affine())
+
+    def xyz(self):
+        """(x, y, z) 순서 뷰 (nibabel get_fdata 와 같은 index)"""
+        return self.array.transpose(2, 1, 0)
+
+    def mapped(self, cache_dir=VIEW_CACHE_DIR):
+        """
+        memory-map 된 같은 영상 (RAM 에는 실제로 읽은 slice 만 올라감)
+
+        비압축 .nii 사본이 있으면 그것을, 없으면 cache_dir 에 .npy 로 한 번 써서 사용.
+        geometry 는 항상 이 영상의 값을 그대로 씀 (NIfTI header 는 float32 라
+        다시 읽으면 값이 조금 달라져 필터 캐시 키가 바뀜)
+        """
+        if isinstance(self.array, np.memmap):
+            return self
+        if self.path and self.path.endswith(".nii"):
+            mapped = Volume.from_file(self.path, mmap=True)
+            return Volume(mapped.array, self.spacing, self.origin, self.direction, self.path)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        _purge_view_cache(cache_dir)
+        fd, cache_path = tempfile.mkstemp(suffix=".npy", dir=cache_dir)
+        os.close(fd)
+
+        out = np.lib.format.open_memmap(cache_path, mode="w+", dtype=self.array.dtype,
+                                        shape=self.array.shape)
+        out[...] = self.array
+        out.flush()
+        del out
+
+        array = np.load(cache_path, mmap_mode="r")
+        return Volume(array, self.spacing, self.origin, self.direction)
+
+    def like(self, array):
+        """같은 geometry 의 새 영상 (array 는 z, y, x 순서)"""
+        return Volume(array, self.spacing, self.origin, self.direction)
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+
+def _purge_view_cache(cache_dir):
+    # 열려 있는 파일은 (Windows 에서) 지워지지 않으므로 오래된 것만 정리
+    cutoff = time.time() - VIEW_CACHE_MAX_AGE
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+def as_sitk(image):
+    """경로 / Volume / sitk.Image 중 무엇이든 sitk.Image 로"""
+    if isinstance(image, Volume):
+        return image.to_sitk()
+    if isinstance(image, sitk.Image):
+        return image
+    return sitk.ReadImage(image)
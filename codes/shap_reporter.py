@@ -4,9 +4,7 @@ class ShapGraphDialog(QDialog):
         self.setWindowTitle(f"SHAP 분석 결과 - {patient_name}")
         self.setGeometry(300, 200, 1200, 700)
 
-        self.report_thread = None
         self.report_worker = None
-        self.biomistral_generator = None  # 생성기 인스턴스 저장소
 
         # Main horizontal layout (그래프 | 리포트)
         main_layout = QHBoxLayout(self)
@@ -35,7 +33,20 @@ class ShapGraphDialog(QDialog):
         # 람다 대신 메서드 직접 연결
         self.generate_btn.clicked.connect(self.start_report_generation) 
         self.generate_btn.setStyleSheet("background-color: #2196F3; color: white; font-weight: bold; padding: 8px;")
-        right_layout.addWidget(self.generate_btn)
+
+        self.stop_btn = QPushButton("⏹ Stop")
+        self.stop_btn.clicked.connect(self.stop_report_generation)
+        self.stop_btn.setEnabled(False)
+        self.stop_btn.setStyleSheet("padding: 8px;")
+
+        gen_layout = QHBoxLayout()
+        gen_layout.addWidget(self.generate_btn, 1)
+        gen_layout.addWidget(self.stop_btn)
+        right_layout.addLayout(gen_layout)
+
+        self.stats_label = QLabel("")
+        self.stats_label.setStyleSheet("color: gray; padding: 2px;")
+        right_layout.addWidget(self.stats_label)
         
         main_layout.addLayout(right_layout, 4)
         
@@ -54,57 +65,118 @@ class ShapGraphDialog(QDialog):
         
         self.top_features_df = top_features_df
 
+        # SHAP DataFrame 준비
+        self.shap_df = pd.DataFrame({
+            'feature': top_features_df['Feature'].values,
+            'shap_value': top_features_df['SHAP_Value'].values
+        })
+        self.seed = REPORT_SEED
+        self.report_shown = False
+        self.show_saved_report()
+
+    def show_saved_report(self):
+        """같은 SHAP 값 / 설정으로 마지막에 만든 리포트가 있으면 바로 표시"""
+        try:
+            store = get_report_store()
+            report = latest_report(store, latest_report_key(self.shap_df))
+            if report is None:
+                key, _ = report_cache_key(self.shap_df, self.seed)
+                report = lookup_report(store, key)
+        except Exception:
+            traceback.print_exc()
+            return
+        if report is None:
+            return
+        self.streaming = False
+        self.on_report_success(report)
+        self.stats_label.setText("♻️ Saved report - click 'Regenerate' for a new one")
+
     def start_report_generation(self):
-        """스레드를 시작하여 리포트를 생성합니다."""
+        """작업 실행기에 리포트 생성을 맡깁니다."""
         # UI 상태 변경
         self.generate_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
+        self.stats_label.setText("")
         self.report_text.setPlainText("⏳ Initializing process...\n")
+        self.streaming = False
         
-        # 기존 스레드 정리
-        if self.report_thread is not None:
-            if self.report_thread.isRunning():
-                self.report_thread.quit()
-                self.report_thread.wait()
-            self.report_thread.deleteLater()
-            
-        # SHAP DataFrame 준비
-        shap_df = pd.DataFrame({
-            'feature': self.top_features_df['Feature'].values,
-            'shap_value': self.top_features_df['SHAP_Value'].values
-        })
+        # 진행 중인 리포트 작업이 있으면 취소하고 시그널을 끊음
+        self._release_worker()
+
+        # 이미 리포트를 보고 다시 누른 경우는 새 시드로 생성 (저장된 리포트를 쓰지 않음)
+        if self.report_shown:
+            self.seed = random.randrange(1, 2 ** 31)
 
-        # Worker 및 Thread 설정
-        self.report_thread = QThread()
-        # generator 인스턴스를 전달 (없으면 Worker 내부에서 생성됨)
-        self.report_worker = ReportGenWorker(self.biomistral_generator, shap_df)
-        self.report_worker.moveToThread(self.report_thread)
+        # Worker 설정 - 공용 작업 실행기에서 실행 (분석/재예측보다 낮은 우선순위)
+        # 모델은 앱 전체가 공유하는 리포트 서비스에서 가져옴
+        self.report_worker = ReportGenWorker(self.shap_df, seed=self.seed)
         
         # 시그널 연결
-        self.report_thread.started.connect(self.report_worker.run)
         self.report_worker.log.connect(self.update_log)
+        self.report_worker.token_text.connect(self.on_report_token)
+        self.report_worker.stats.connect(self.on_report_stats)
         self.report_worker.finished.connect(self.on_report_success)
         self.report_worker.error.connect(self.on_report_error)
         
-        # 종료 처리
-        self.report_worker.finished.connect(self.report_thread.quit)
-        self.report_worker.finished.connect(self.report_worker.deleteLater)
-        self.report_thread.finished.connect(self.report_thread.deleteLater)
-        
-        # 스레드 시작
-        self.report_thread.start()
+        get_job_executor().submit(self.report_worker.run, priority=PRIORITY_REPORT,
+                                  name="report", token=self.report_worker.token)
+
+    def _release_worker(self):
+        """현재 리포트 작업 취소 + 시그널 해제"""
+        if self.report_worker is None:
+            return
+        self.report_worker.token.cancel()
+        try:
+            self.report_worker.disconnect()
+        except (RuntimeError, TypeError):
+            pass
+        self.report_worker = None
+
+    def _from_current_worker(self):
+        # 끊기 전에 이미 큐에 들어간 이전 작업의 시그널은 무시
+        sender = self.sender()
+        return sender is None or sender is self.report_worker
+
+    def on_report_token(self, text):
+        """생성되는 토큰을 바로 이어 붙임"""
+        if not self._from_current_worker():
+            return
+        if not self.streaming:
+            # 첫 토큰이 오면 진행 로그를 지우고 리포트 본문만 표시
+            self.streaming = True
+            self.report_text.setPlainText("")
+        cursor = self.report_text.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        self.report_text.setTextCursor(cursor)
+        self.report_text.ensureCursorVisible()
+
+    def stop_report_generation(self):
+        """생성 중단 - 지금까지 나온 부분은 그대로 둠"""
+        self._release_worker()
+        self.generate_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        self.report_text.appendPlainText("\n⏹️ Generation stopped.")
 
     def update_log(self, message):
         """진행 상황을 텍스트 박스에 표시"""
+        if not self._from_current_worker():
+            return
         self.report_text.appendPlainText(message)
 
+    def on_report_stats(self, text):
+        if self._from_current_worker():
+            self.stats_label.setText(text)
+
     def on_report_success(self, report_content):
         """생성 성공 시 호출"""
+        if not self._from_current_worker():
+            return
         self.generate_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        self.report_shown = True
+        self.generate_btn.setText("🔄 Regenerate")
         
-        # 생성된 generator 인스턴스를 저장해둠 (다음 번 클릭 시 로딩 시간 단축)
-        if self.biomistral_generator is None:
-             self.biomistral_generator = self.report_worker.generator
-
         self.report_text.setPlainText("=" * 60 + "\n")
         self.report_text.appendPlainText("BIOMISTRAL RADIOLOGICAL REPORT\n")
         self.report_text.appendPlainText("=" * 60 + "\n\n")
@@ -114,17 +186,18 @@ class ShapGraphDialog(QDialog):
 
     def on_report_error(self, error_msg):
         """에러 발생 시 호출"""
+        if not self._from_current_worker():
+            return
         self.generate_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
         self.report_text.setPlainText(f"❌ Error generating report:\n\n{error_msg}\n")
         self.report_text.appendPlainText("\nPossible solutions:\n")
         self.report_text.appendPlainText("1. Check VRAM/RAM availability.\n")
         self.report_text.appendPlainText("2. Check internet for model download.\n")
 
     def close_dialog(self):
-        """다이얼로그 닫을 때 스레드 안전하게 종료"""
-        if self.report_thread is not None and self.report_thread.isRunning():
-            self.report_thread.quit()
-            self.report_thread.wait(1000)
+        """다이얼로그 닫을 때 진행 중인 리포트 작업 취소 (기다리지 않음)"""
+        self._release_worker()
         self.accept()
         
     # plot_shap 메서드는 기존 그대로 유지
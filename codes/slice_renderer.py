@@ -0,0 +1,212 @@
+class SliceRenderer(QObject):
+    """
+    뷰어 slice 렌더링 (CT + mask 윤곽 RGB QImage) 캐시
+
+    렌더링은 모두 백그라운드 스레드 하나에서 하고, 끝난 QImage 는 ready 시그널로
+    GUI 스레드에 전달 (GUI 는 pixmap 으로 올리기만 함). 렌더링한 slice 는
+    (view, slice) 키로 LRU 에 보관하고, mask 윤곽은 view 별로 mask bbox 안에서
+    한 번만 계산. 요청이 없을 때는 각 view 의 현재 slice 주변을 미리 렌더링
+    """
+
+    ready = Signal(str, int, object)  # view, slice, QImage
+
+    # view → slice 축 (volume 은 x, y, z 순서)
+    AXES = {"axial": 2, "coronal": 1, "sagittal": 0}
+
+    def __init__(self, ct_vol, mask_vol, max_slices=96, prefetch_radius=6):
+        super().__init__()
+        self.ct_vol = ct_vol
+        self.mask_vol = mask_vol
+        self.max_slices = max_slices
+        self.prefetch_radius = prefetch_radius
+
+        self._cache = OrderedDict()  # (view, s) -> QImage
+        self._edges = {}             # view -> (bbox 시작, 윤곽 sub-volume) 또는 None
+        self._generation = 0         # mask 가 바뀌면 증가 (이전 렌더링 결과 폐기)
+        self._lock = threading.Lock()
+
+        self._wanted = {}   # view -> 화면에 보여야 하는 slice (먼저 렌더링)
+        self._targets = {}  # view -> (s, smin, smax) 미리 렌더링할 범위
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._render_loop, daemon=True)
+        self._thread.start()
+
+    # ----------------------------------------------------------
+    def cached(self, view, s):
+        """캐시에 있는 slice (없으면 None)"""
+        key = (view, s)
+        with self._lock:
+            qimg = self._cache.get(key)
+            if qimg is not None:
+                self._cache.move_to_end(key)
+            return qimg
+
+    def request(self, view, s, smin, smax):
+        """
+        view 에 slice s 를 표시하도록 요청
+
+        캐시에 있으면 바로 반환, 없으면 None 을 반환하고 렌더링이 끝나면 ready 로 전달.
+        같은 view 의 이전 요청은 대체되고, 주변 slice 는 이어서 미리 렌더링
+        """
+        qimg = self.cached(view, s)
+        with self._cond:
+            if qimg is None:
+                self._wanted[view] = s
+            else:
+                self._wanted.pop(view, None)
+            self._targets[view] = (s, smin, smax)
+            self._cond.notify()
+        return qimg
+
+    def mask_changed(self):
+        """mask 편집 후 호출 - 윤곽과 렌더링 캐시를 모두 다시 만듦"""
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+            self._edges.clear()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    # ----------------------------------------------------------
+    def plane_shape(self, view):
+        """slice 의 (화면 폭, 화면 높이)"""
+        a, b = np.delete(self.mask_vol.shape, self.AXES[view])
+        return int(a), int(b)
+
+    def to_display(self, view, xyz):
+        """volume 좌표 → 화면 (열, 행) - _orient 와 같은 변환"""
+        axis = self.AXES[view]
+        p, q = [xyz[i] for i in range(3) if i != axis]
+        a, b = self.plane_shape(view)
+        return a - 1 - p, b - 1 - q
+
+    def from_display(self, view, s, col, row):
+        """화면 (열, 행) → volume 좌표 (slice 축은 s)"""
+        a, b = self.plane_shape(view)
+        xyz = [a - 1 - col, b - 1 - row]
+        xyz.insert(self.AXES[view], s)
+        return xyz
+
+    # ----------------------------------------------------------
+    def _store(self, key, qimg, generation):
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._cache[key] = qimg
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_slices:
+                self._cache.popitem(last=False)
+            return True
+
+    def _next_prefetch(self):
+        # 아직 캐시에 없는 주변 slice 하나 (cond 를 잡은 상태에서 호출)
+        for view, (s, smin, smax) in list(self._targets.items()):
+            for d in range(1, self.prefetch_radius + 1):
+                for n in (s + d, s - d):
+                    if smin <= n <= smax and self.cached(view, n) is None:
+                        return view, n
+            del self._targets[view]
+        return None
+
+    def _render_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._wanted or self._targets)
+                if self._closed:
+                    return
+                if self._wanted:
+                    view, s = self._wanted.popitem()
+                    visible = True
+                else:
+                    job = self._next_prefetch()
+                    if job is None:
+                        continue
+                    view, s = job
+                    visible = False
+
+            with self._lock:
+                generation = self._generation
+            try:
+                qimg = self._render(view, s)
+            except Exception as e:
+                print(f"Render error: {e}")
+                continue
+
+            if self._store((view, s), qimg, generation) and visible:
+                self.ready.emit(view, s, qimg)
+            elif visible:
+                # 렌더링 중 mask 가 바뀌었으면 다시 렌더링
+                with self._cond:
+                    self._wanted.setdefault(view, s)
+
+    # ----------------------------------------------------------
+    @staticmethod
+    def _orient(plane):
+        # 화면 표시 방향 (기존 update_slice_view 와 동일)
+        return np.fliplr(np.rot90(plane))
+
+    def _take(self, vol, view, s):
+        return np.take(vol, s, axis=self.AXES[view])
+
+    def _edge_volume(self, view):
+        """view 평면 기준 2D erosion 으로 만든 mask 윤곽 (mask bbox 안만 저장)"""
+        with self._lock:
+            if view in self._edges:
+                return self._edges[view]
+            generation = self._generation
+
+        mask = self.mask_vol > 0
+        nonzero = [np.flatnonzero(mask.any(axis=tuple(a for a in range(3) if a != ax)))
+                   for ax in range(3)]
+        if any(len(idx) == 0 for idx in nonzero):
+            edges = None
+        else:
+            # 경계에서 erosion 결과가 slice 단위 계산과 같도록 1 voxel 여유
+            start = [max(0, idx[0] - 1) for idx in nonzero]
+            stop = [min(mask.shape[a], idx[-1] + 2) for a, idx in enumerate(nonzero)]
+            sub = mask[tuple(slice(a, b) for a, b in zip(start, stop))]
+
+            structure = np.expand_dims(generate_binary_structure(2, 1), self.AXES[view])
+            edges = (tuple(start), np.logical_xor(sub, binary_erosion(sub, structure)))
+
+        with self._lock:
+            if generation == self._generation:
+                self._edges[view] = edges
+        return edges
+
+    def _edge_slice(self, view, s):
+        axis = self.AXES[view]
+        plane = np.zeros(np.delete(self.mask_vol.shape, axis), dtype=bool)
+
+        edges = self._edge_volume(view)
+        if edges is None:
+            return plane
+        start, sub = edges
+        local = s - start[axis]
+        if not 0 <= local < sub.shape[axis]:
+            return plane
+
+        lo = [v for a, v in enumerate(start) if a != axis]
+        sub_plane = np.take(sub, local, axis=axis)
+        plane[lo[0]:lo[0] + sub_plane.shape[0], lo[1]:lo[1] + sub_plane.shape[1]] = sub_plane
+        return plane
+
+    def _render(self, view, s):
+        # memory-map 된 CT 에서 이 slice 만 읽어 float 로 변환
+        img = self._orient(self._take(self.ct_vol, view, s)).astype(np.float32)
+        edge = self._orient(self._edge_slice(view, s))
+
+        lo, hi = img.min(), img.max()
+        gray = ((img - lo) / (hi - lo + 1e-6) * 255).astype(np.uint8)
+
+        h, w = gray.shape
+        overlay = np.empty((h, w, 3), dtype=np.uint8)
+        overlay[...] = gray[..., None]
+        overlay[edge] = [255, 0, 0]
+
+        # copy() 로 numpy 버퍼와 분리해 캐시에 안전하게 보관
+        return QImage(overlay.data, w, h, 3 * w, QImage.Format_RGB888).copy()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 파이프라인 모듈은 separated_codes 안에서 서로를 최상위 모듈로 import 함
+sys.path.insert(0, os.path.join(ROOT, "codes", "separated_codes"))
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pytest
+
+sitk = pytest.importorskip("SimpleITK")
+pytest.importorskip("radiomics")
+
+from filter_cache import FilteredImageCache
+from radiomics_extr import FEATURE_COLS, extract_radiomics
+
+PARAMS_YAML = os.path.join(os.path.dirname(__file__), os.pardir, "assets", "parameters.yaml")
+
+
+def _synthetic_case(shape=(48, 56, 64), spacing=(1.5, 0.8, 0.8)):
+    """잡음 배경 + 밝은 타원체 병변과 그 마스크 (z, y, x)"""
+    rng = np.random.default_rng(0)
+    zz, yy, xx = np.indices(shape)
+    centre = [n / 2 for n in shape]
+    r = ((zz - centre[0]) / 8) ** 2 + ((yy - centre[1]) / 10) ** 2 + ((xx - centre[2]) / 12) ** 2
+
+    ct = rng.normal(40, 15, shape) + 60 * np.exp(-r)
+    ct = ct.astype(np.int16)
+    mask = (r <= 1).astype(np.uint8)
+
+    img = sitk.GetImageFromArray(ct)
+    img.SetSpacing(spacing[::-1])
+    img.SetOrigin((-20.0, 35.5, 110.0))
+    seg = sitk.GetImageFromArray(mask)
+    seg.CopyInformation(img)
+    return img, seg
+
+
+def _assert_features_close(expected, actual, rtol=1e-3, atol=1e-6):
+    for feat in FEATURE_COLS:
+        a, b = float(expected.at[0, feat]), float(actual.at[0, feat])
+        if np.isnan(a) and np.isnan(b):
+            continue
+        assert np.isclose(b, a, rtol=rtol, atol=atol), f"{feat}: {a} != {b}"
+
+
+def test_cropped_extraction_matches_full_volume():
+    img, mask = _synthetic_case()
+
+    full = extract_radiomics(img, mask, PARAMS_YAML)
+    cropped = extract_radiomics(img, mask, PARAMS_YAML, crop=True)
+
+    assert full[FEATURE_COLS].notna().any(axis=None)
+    _assert_features_close(full, cropped)
+
+
+def test_cropped_extraction_with_cache_matches_and_reuses_filters():
+    img, mask = _synthetic_case()
+    cache = FilteredImageCache()
+
+    full = extract_radiomics(img, mask, PARAMS_YAML)
+    first = extract_radiomics(img, mask, PARAMS_YAML, crop=True, cache=cache)
+    stored = len(cache._entries)
+    second = extract_radiomics(img, mask, PARAMS_YAML, crop=True, cache=cache)
+
+    assert stored > 0
+    assert len(cache._entries) == stored  # 두 번째는 모두 캐시 적중
+    _assert_features_close(full, first)
+    _assert_features_close(first, second, rtol=0, atol=0)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+sitk = pytest.importorskip("SimpleITK")
+pytest.importorskip("nibabel")
+
+from filter_cache import image_digest
+from volume import Volume
+
+
+def _oblique_volume():
+    rng = np.random.default_rng(0)
+    array = rng.integers(-1024, 2000, size=(12, 20, 24), dtype=np.int16)
+    # float32 로 정확히 표현되지 않는 geometry
+    theta = 0.1234567
+    c, s = np.cos(theta), np.sin(theta)
+    direction = (c, -s, 0.0, s, c, 0.0, 0.0, 0.0, 1.0)
+    return Volume(array, (0.7031249, 0.7031249, 1.2500001), (-180.123456, -95.654321, 1234.5678901),
+                  direction)
+
+
+def test_mapped_copy_of_saved_nifti_keeps_geometry(tmp_path):
+    volume = _oblique_volume()
+    volume.save(str(tmp_path / "ct.nii"))
+
+    mapped = volume.mapped()
+
+    assert mapped.spacing == volume.spacing
+    assert mapped.origin == volume.origin
+    assert mapped.direction == volume.direction
+    assert image_digest(mapped.to_sitk()) == image_digest(volume.to_sitk())
+
+
+def test_mapped_copy_without_disk_copy_keeps_geometry(tmp_path):
+    volume = _oblique_volume()
+
+    mapped = volume.mapped(cache_dir=str(tmp_path))
+
+    assert isinstance(mapped.array, np.memmap)
+    assert image_digest(mapped.to_sitk()) == image_digest(volume.to_sitk())